@@ -0,0 +1,45 @@
+from functools import lru_cache
+from typing import Callable, List
+import numpy as np
+
+# Scores a N x cells array of board grids, returns N scores
+BatchEval = Callable[[np.ndarray, int, int], np.ndarray]
+
+
+def grids_to_array(grids: List[List[int]]) -> np.ndarray:
+    """
+    Stacks board grids into a N x cells array
+    """
+    return np.array(grids, dtype=np.int8)
+
+
+def batch_eval_1(grids: np.ndarray, num_rows: int, num_cols: int) -> np.ndarray:
+    """
+    eval_1 for a batch of grids
+    Difference between player 1 pieces and player 2 pieces
+    """
+    return (grids == 1).sum(axis=1) - (grids == 2).sum(axis=1)
+
+
+@lru_cache(maxsize=None)
+def border_cells(num_rows: int, num_cols: int) -> np.ndarray:
+    """
+    Indices of the border cells
+    """
+    return np.array(
+        [
+            y * num_cols + x
+            for y in range(num_rows)
+            for x in range(num_cols)
+            if x in (0, num_cols - 1) or y in (0, num_rows - 1)
+        ]
+    )
+
+
+def batch_eval_2(grids: np.ndarray, num_rows: int, num_cols: int) -> np.ndarray:
+    """
+    eval_2 for a batch of grids
+    Number of pieces in the borders
+    """
+    border = grids[:, border_cells(num_rows, num_cols)]
+    return (border == 1).sum(axis=1) - (border == 2).sum(axis=1)
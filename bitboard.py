@@ -0,0 +1,381 @@
+from functools import lru_cache
+from typing import Dict, Iterator, List, Literal, Tuple
+from board import Board, get_geometry
+
+# Masks are (shift, step_mask, jump_mask) per direction
+Masks = List[Tuple[int, int, int]]
+# Jumps are (over_mask, landing_mask) per square
+Jumps = List[List[Tuple[int, int]]]
+
+
+@lru_cache(maxsize=None)
+def direction_masks(num_rows: int, num_cols: int) -> Masks:
+    """
+    Returns (shift, step_mask, jump_mask) for every direction
+    step_mask has the squares that can move one cell in that direction
+    jump_mask has the squares that can jump two cells in that direction
+    """
+    masks: Dict[int, List[int]] = {}
+    for i, links in enumerate(get_geometry(num_rows, num_cols).links):
+        for n, land in links:
+            step_jump = masks.setdefault(n - i, [0, 0])
+            step_jump[0] |= 1 << i
+            if land >= 0:
+                step_jump[1] |= 1 << i
+
+    return [(shift, step, jump) for shift, (step, jump) in masks.items()]
+
+
+@lru_cache(maxsize=None)
+def square_jumps(num_rows: int, num_cols: int) -> Jumps:
+    """
+    Returns for every square the (over_mask, landing_mask) of every jump
+    that can start there
+    """
+    return [
+        [(1 << n, 1 << land) for n, land in links if land >= 0]
+        for links in get_geometry(num_rows, num_cols).links
+    ]
+
+
+def eat_masks(own: int, opp: int, empty: int, masks: Masks) -> List[Tuple[int, int]]:
+    """
+    Returns (shift, landing_mask) for every direction where own can eat
+    """
+    ret = []
+    for shift, _, jump in masks:
+        if shift > 0:
+            land = ((((own & jump) << shift) & opp) << shift) & empty
+        else:
+            land = ((((own & jump) >> -shift) & opp) >> -shift) & empty
+        if land:
+            ret.append((shift, land))
+    return ret
+
+
+def any_capture(own: int, opp: int, empty: int, masks: Masks) -> bool:
+    """
+    Whether own can eat, stops at the first direction with an eat
+    """
+    for shift, _, jump in masks:
+        if shift > 0:
+            if ((((own & jump) << shift) & opp) << shift) & empty:
+                return True
+        elif ((((own & jump) >> -shift) & opp) >> -shift) & empty:
+            return True
+    return False
+
+
+def can_eat_from(i: int, opp: int, empty: int, jumps: Jumps) -> bool:
+    """
+    Whether the piece at square i can eat
+    """
+    for over, land in jumps[i]:
+        if over & opp and land & empty:
+            return True
+    return False
+
+
+def capture_codes(own: int, opp: int, empty: int, masks: Masks) -> List[int]:
+    """
+    Encoded eats of own
+    """
+    ret: List[int] = []
+    for shift, land in eat_masks(own, opp, empty, masks):
+        while land:
+            bit = land & -land
+            land ^= bit
+            i = bit.bit_length() - 1
+            ret.append((i - 2 * shift) | i << 8 | (i - shift + 1) << 16)
+    return ret
+
+
+def iter_capture_codes(own: int, opp: int, empty: int, masks: Masks) -> Iterator[int]:
+    """
+    Same eats as capture_codes, one direction is only looked at once the
+    eats of the previous one are used
+    """
+    for shift, _, jump in masks:
+        if shift > 0:
+            land = ((((own & jump) << shift) & opp) << shift) & empty
+        else:
+            land = ((((own & jump) >> -shift) & opp) >> -shift) & empty
+        while land:
+            bit = land & -land
+            land ^= bit
+            i = bit.bit_length() - 1
+            yield (i - 2 * shift) | i << 8 | (i - shift + 1) << 16
+
+
+def move_codes(own: int, empty: int, masks: Masks) -> List[int]:
+    """
+    Encoded moves of own that don't eat
+    """
+    ret: List[int] = []
+    for shift, step, _ in masks:
+        if shift > 0:
+            dest = ((own & step) << shift) & empty
+        else:
+            dest = ((own & step) >> -shift) & empty
+        while dest:
+            bit = dest & -dest
+            dest ^= bit
+            i = bit.bit_length() - 1
+            ret.append((i - shift) | i << 8)
+    return ret
+
+
+def chain_codes(own: int, opp: int, empty: int, jumps: Jumps) -> List[int]:
+    """
+    Encoded eats of own as whole capture chains
+    """
+    ret: List[int] = []
+    pieces = own
+    while pieces:
+        bit = pieces & -pieces
+        pieces ^= bit
+        i = bit.bit_length() - 1
+        if can_eat_from(i, opp, empty, jumps):
+            _extend_chain(i | i << 8, i, 16, opp, empty, jumps, ret)
+    return ret
+
+
+def _extend_chain(
+    code: int, cur: int, shift: int, opp: int, empty: int, jumps: Jumps, ret: List[int]
+) -> None:
+    """
+    Appends to ret every longest continuation of the chain in code
+    The piece is at cur and the next eaten cell goes at shift
+    """
+    extended = False
+    for over, land in jumps[cur]:
+        if not (over & opp and land & empty):
+            continue
+
+        extended = True
+        dest = land.bit_length() - 1
+        _extend_chain(
+            # bit_length is the cell index + 1
+            (code & ~0xFF00) | dest << 8 | over.bit_length() << shift,
+            dest,
+            shift + 8,
+            opp ^ over,
+            (empty | over | 1 << cur) ^ land,
+            jumps,
+            ret,
+        )
+
+    if not extended:
+        ret.append(code)
+
+
+class BitBoard(Board):
+    """
+    Board that keeps each player as a bitmask
+    Actions are generated with shifts and ANDs over the whole board at once
+    The bitmasks are the position, actions don't touch the grid, it is
+    rebuilt from them the first time it is read after they changed
+    Pieces must be changed with set_piece, not through the grid
+    """
+
+    bits: List[int]
+
+    def __init__(
+        self,
+        num_rows: int,
+        num_cols: int,
+        next_player: int = 1,
+        grid: List[int] = [],
+    ) -> None:
+        self._grid: List[int] | None = None
+        super().__init__(num_rows, num_cols, next_player, grid)
+        self.full = (1 << (num_rows * num_cols)) - 1
+        self.masks = direction_masks(num_rows, num_cols)
+        self.jumps = square_jumps(num_rows, num_cols)
+
+        self.bits = [0, 0, 0]
+        for i, v in enumerate(self.grid):
+            if v != 0:
+                self.bits[v] |= 1 << i
+
+    @property  # type: ignore[override]
+    def grid(self) -> List[int]:
+        grid = self._grid
+        if grid is None:
+            bits1, bits2 = self.bits[1], self.bits[2]
+            grid = [
+                (bits1 >> i & 1) | (bits2 >> i & 1) << 1
+                for i in range(self.num_rows * self.num_cols)
+            ]
+            self._grid = grid
+        return grid
+
+    @grid.setter
+    def grid(self, grid: List[int]) -> None:
+        self._grid = grid
+
+    def get_piece_unchecked(self, x: int, y: int) -> int:
+        i = (y * self.num_cols) + x
+        return (self.bits[1] >> i & 1) | (self.bits[2] >> i & 1) << 1
+
+    def set_piece_unchecked(self, x: int, y: int, val: int) -> None:
+        i = (y * self.num_cols) + x
+        old = self.get_piece_unchecked(x, y)
+        if old != 0:
+            self.bits[old] &= ~(1 << i)
+        if val != 0:
+            self.bits[val] |= 1 << i
+        self.grid[i] = val
+
+    def get_piece_codes(self, x: int, y: int) -> List[int]:
+        i = (y * self.num_cols) + x
+        own = self.bits[self.next_player]
+        opp = self.bits[3 - self.next_player]
+        empty = self.full ^ (own | opp)
+
+        ret: List[int] = []
+        for over, land in self.jumps[i]:
+            if over & opp and land & empty:
+                # bit_length is the cell index + 1
+                ret.append(i | (land.bit_length() - 1) << 8 | over.bit_length() << 16)
+        if ret:
+            return ret
+
+        return move_codes(own & (1 << i), empty, self.masks)
+
+    def has_any_capture(self) -> bool:
+        own = self.bits[self.next_player]
+        opp = self.bits[3 - self.next_player]
+        return any_capture(own, opp, self.full ^ (own | opp), self.masks)
+
+    def get_capture_codes(self) -> List[int]:
+        own = self.bits[self.next_player]
+        opp = self.bits[3 - self.next_player]
+        return capture_codes(own, opp, self.full ^ (own | opp), self.masks)
+
+    def iter_capture_codes(self) -> Iterator[int]:
+        own = self.bits[self.next_player]
+        opp = self.bits[3 - self.next_player]
+        return iter_capture_codes(own, opp, self.full ^ (own | opp), self.masks)
+
+    def get_chain_codes(self) -> List[int]:
+        own = self.bits[self.next_player]
+        opp = self.bits[3 - self.next_player]
+        return chain_codes(own, opp, self.full ^ (own | opp), self.jumps)
+
+    def get_valid_codes(self, chains: bool = False) -> List[int]:
+        bits = self.bits
+        own = bits[self.next_player]
+        opp = bits[3 - self.next_player]
+        empty = self.full ^ (own | opp)
+        if chains:
+            ret = chain_codes(own, opp, empty, self.jumps)
+            if ret:
+                return ret
+
+        # Same as capture_codes and move_codes, inlined as this runs at every node
+        ret = []
+        masks = self.masks
+        if not chains:
+            for shift, _, jump in masks:
+                if shift > 0:
+                    land = ((((own & jump) << shift) & opp) << shift) & empty
+                else:
+                    land = ((((own & jump) >> -shift) & opp) >> -shift) & empty
+                while land:
+                    bit = land & -land
+                    land ^= bit
+                    i = bit.bit_length() - 1
+                    ret.append((i - 2 * shift) | i << 8 | (i - shift + 1) << 16)
+            if ret:
+                return ret
+
+        for shift, step, _ in masks:
+            if shift > 0:
+                dest = ((own & step) << shift) & empty
+            else:
+                dest = ((own & step) >> -shift) & empty
+            while dest:
+                bit = dest & -dest
+                dest ^= bit
+                i = bit.bit_length() - 1
+                ret.append((i - shift) | i << 8)
+        return ret
+
+    def _can_eat_from(self, i: int) -> bool:
+        opp = self.bits[2 if self.bits[1] >> i & 1 else 1]
+        empty = self.full ^ (self.bits[1] | self.bits[2])
+        return can_eat_from(i, opp, empty, self.jumps)
+
+    def make(self, code: int) -> None:
+        bits = self.bits
+        zobrist = self.geometry.zobrist
+        source = code & 0xFF
+        dest = code >> 8 & 0xFF
+
+        t = 1 if bits[1] >> source & 1 else 2
+        bits[t] ^= 1 << source ^ 1 << dest
+        self._grid = None
+        self._key ^= zobrist[source][t] ^ zobrist[dest][t]
+        weights = self.weights
+        if weights is not None:
+            self.score += weights[t][dest] - weights[t][source]
+
+        eaten = code >> 16
+        if eaten:
+            opp = 3 - t
+            while eaten:
+                target = (eaten & 0xFF) - 1
+                bits[opp] ^= 1 << target
+                self.counts[opp] -= 1
+                self._key ^= zobrist[target][opp]
+                if weights is not None:
+                    self.score -= weights[opp][target]
+                eaten >>= 8
+            empty = self.full ^ (bits[1] | bits[2])
+            if can_eat_from(dest, bits[opp], empty, self.jumps):
+                return
+
+        self.next_player = 3 - self.next_player
+        self._key ^= self.geometry.zobrist_side
+
+    def unmake(self, code: int) -> None:
+        bits = self.bits
+        zobrist = self.geometry.zobrist
+        source = code & 0xFF
+        dest = code >> 8 & 0xFF
+
+        t = 1 if bits[1] >> dest & 1 else 2
+        bits[t] ^= 1 << source ^ 1 << dest
+        self._grid = None
+        self._key ^= zobrist[source][t] ^ zobrist[dest][t]
+        weights = self.weights
+        if weights is not None:
+            self.score += weights[t][source] - weights[t][dest]
+
+        eaten = code >> 16
+        opp = 3 - t
+        while eaten:
+            target = (eaten & 0xFF) - 1
+            bits[opp] |= 1 << target
+            self.counts[opp] += 1
+            self._key ^= zobrist[target][opp]
+            if weights is not None:
+                self.score += weights[opp][target]
+            eaten >>= 8
+
+        if self.next_player != t:
+            self.next_player = t
+            self._key ^= self.geometry.zobrist_side
+
+    def is_terminal(self) -> Literal[0, 1, 2, 3]:
+        count1, count2 = self.counts[1], self.counts[2]
+
+        if count1 == 0:
+            return 2
+        elif count2 == 0:
+            return 1
+        elif count1 == count2 == 1 and not self.has_any_capture():
+            return 3
+
+        return 0
@@ -1,7 +1,54 @@
-from typing import List, Literal, Protocol, Tuple
+from functools import lru_cache
+import random
+import sys
+from typing import Iterator, List, Literal, Protocol, Tuple
 from dataclasses import dataclass
 
 
+# Actions are also encoded as plain ints so the search doesn't allocate objects
+# bits 0-7   source cell index
+# bits 8-15  destination cell index
+# bits 16-23 eaten cell index + 1, 0 for a plain move
+# Capture chains keep adding eaten cells every 8 bits (24-31, 32-39, ...)
+
+
+def encode_move(source: int, dest: int) -> int:
+    return source | dest << 8
+
+
+def encode_eat(hunter: int, target: int, dest: int) -> int:
+    return hunter | dest << 8 | (target + 1) << 16
+
+
+def eaten_count(code: int) -> int:
+    """
+    Number of pieces an encoded action eats
+    """
+    return (code.bit_length() - 9) // 8 if code >> 16 else 0
+
+
+def transform_code(code: int, cells: Tuple[int, ...]) -> int:
+    """
+    Encoded action moved to other cells, cell i goes to cells[i]
+    """
+    ret = cells[code & 0xFF] | cells[code >> 8 & 0xFF] << 8
+    eaten = code >> 16
+    shift = 16
+    while eaten:
+        ret |= (cells[(eaten & 0xFF) - 1] + 1) << shift
+        eaten >>= 8
+        shift += 8
+    return ret
+
+
+# Image keys take 64 bits of the packed keys per symmetry
+KEY_BITS = 64
+
+# Score of every piece on every cell, weights[piece][cell], piece 0 is empty
+# See linear_eval.py
+Weights = Tuple[Tuple[float, ...], Tuple[float, ...], Tuple[float, ...]]
+
+
 class Action(Protocol):
     """
     Everything that changes the board state must implement this protocol
@@ -26,6 +73,155 @@ class Action(Protocol):
         ...
 
 
+@dataclass(frozen=True)
+class Symmetry:
+    """
+    Transformation of the board that keeps the rules
+    Cell i goes to cells[i], with swap the players also trade pieces and turn
+    """
+
+    cells: Tuple[int, ...]
+    inverse: Tuple[int, ...]
+    swap: bool
+
+
+@dataclass
+class Geometry:
+    """
+    Board connections that only depend on the board size
+    """
+
+    num_rows: int
+    num_cols: int
+    coords: List[Tuple[int, int]]
+    # (neighbour, landing) pairs for every cell, landing is -1 if outside the board
+    links: List[List[Tuple[int, int]]]
+    # Only the links whose landing is inside the board
+    jumps: List[List[Tuple[int, int]]]
+    # Symmetries of the board, the identity first
+    symmetries: List[Symmetry]
+    # Zobrist keys for every cell indexed by piece, empty cells are 0
+    zobrist: List[Tuple[int, int, int]]
+    # Zobrist key xored in while player 2 is the next player
+    zobrist_side: int
+    # Keys of the cell in the image under every symmetry, indexed by piece
+    # and packed with symmetry k in bits 64k to 64k + 63, see canonical_key
+    image_zobrist: List[Tuple[int, int, int]]
+    # Packed side keys of every image
+    image_side: int
+    # Packed side keys of the symmetries that swap players, their images
+    # have player 2 next while player 1 is
+    image_swapped: int
+
+
+@lru_cache(maxsize=None)
+def get_geometry(num_rows: int, num_cols: int) -> Geometry:
+    """
+    Builds the geometry once per board size
+    Even cells connect in every direction, odd cells only Up Down Left Right
+    """
+    odd_dirs = [(-1, 0), (1, 0), (0, 1), (0, -1)]
+    even_dirs = odd_dirs + [(-1, -1), (1, 1), (-1, 1), (1, -1)]
+
+    coords = [(i % num_cols, i // num_cols) for i in range(num_rows * num_cols)]
+    links: List[List[Tuple[int, int]]] = []
+    for x, y in coords:
+        ret = []
+        for dx, dy in even_dirs if (x + y) % 2 == 0 else odd_dirs:
+            if not (0 <= x + dx < num_cols and 0 <= y + dy < num_rows):
+                continue
+
+            land = -1
+            if 0 <= x + 2 * dx < num_cols and 0 <= y + 2 * dy < num_rows:
+                land = (y + 2 * dy) * num_cols + x + 2 * dx
+            ret.append(((y + dy) * num_cols + x + dx, land))
+        links.append(ret)
+
+    # Seeded so keys are the same on every run and process
+    rng = random.Random((num_rows << 16) | num_cols)
+    keys = [(0, rng.getrandbits(64), rng.getrandbits(64)) for _ in coords]
+    side = rng.getrandbits(64)
+
+    jumps = [[(n, land) for n, land in ret if land >= 0] for ret in links]
+    symmetries = get_symmetries(num_rows, num_cols, links)
+
+    image_zobrist = []
+    for i in range(len(coords)):
+        packed = [0, 0, 0]
+        for k, symmetry in enumerate(symmetries):
+            image = keys[symmetry.cells[i]]
+            for v in (1, 2):
+                packed[v] |= image[3 - v if symmetry.swap else v] << (KEY_BITS * k)
+        image_zobrist.append((0, packed[1], packed[2]))
+    image_side = 0
+    image_swapped = 0
+    for k, symmetry in enumerate(symmetries):
+        image_side |= side << (KEY_BITS * k)
+        if symmetry.swap:
+            image_swapped |= side << (KEY_BITS * k)
+
+    return Geometry(
+        num_rows,
+        num_cols,
+        coords,
+        links,
+        jumps,
+        symmetries,
+        keys,
+        side,
+        image_zobrist,
+        image_side,
+        image_swapped,
+    )
+
+
+def get_symmetries(
+    num_rows: int, num_cols: int, links: List[List[Tuple[int, int]]]
+) -> List[Symmetry]:
+    """
+    Mirrors, rotations and transposes that keep the links, each one with and
+    without swapping the players
+    Pieces of both players move the same way so swapping them keeps the rules
+    """
+    last_x, last_y = num_cols - 1, num_rows - 1
+    maps = [
+        lambda x, y: (x, y),
+        lambda x, y: (last_x - x, y),
+        lambda x, y: (x, last_y - y),
+        lambda x, y: (last_x - x, last_y - y),
+    ]
+    if num_rows == num_cols:
+        maps += [
+            lambda x, y: (y, x),
+            lambda x, y: (last_y - y, x),
+            lambda x, y: (y, last_x - x),
+            lambda x, y: (last_y - y, last_x - x),
+        ]
+
+    def linked(cells: Tuple[int, ...], i: int) -> List[Tuple[int, int]]:
+        return sorted(
+            (cells[n], -1 if land < 0 else cells[land]) for n, land in links[i]
+        )
+
+    ret = []
+    for transform in maps:
+        cells = tuple(
+            y * num_cols + x
+            for x, y in (
+                transform(i % num_cols, i // num_cols) for i in range(len(links))
+            )
+        )
+        # Boards with even sides swap the cells with 8 and 4 links
+        if any(linked(cells, i) != sorted(links[cells[i]]) for i in range(len(links))):
+            continue
+        inverse = [0] * len(cells)
+        for i, cell in enumerate(cells):
+            inverse[cell] = i
+        for swap in (False, True):
+            ret.append(Symmetry(cells, tuple(inverse), swap))
+    return ret
+
+
 @dataclass
 class Board:
     num_rows: int
@@ -43,9 +239,73 @@ class Board:
         self.num_rows, self.num_cols = num_rows, num_cols
         self.next_player = next_player
         self.grid = grid or initial_board(num_rows, num_cols)
+        self.geometry = get_geometry(num_rows, num_cols)
+
+        # Pieces of each player, index 0 is unused
+        # Kept up to date by the actions
+        self.counts = [0, self.grid.count(1), self.grid.count(2)]
+
+        # Zobrist key, also kept up to date by the actions
+        self._key = self.geometry.zobrist_side if next_player == 2 else 0
+        for i, v in enumerate(self.grid):
+            self._key ^= self.geometry.zobrist[i][v]
+
+        # Sum of the weights of every piece, kept up to date by the actions
+        # once weights are set
+        self.weights: Weights | None = None
+        self.score = 0.0
 
     def __hash__(self):
-        return hash((tuple(self.grid), self.next_player))
+        return self._key
+
+    def copy(self) -> "Board":
+        """
+        Returns an independent board of the same type and position
+        """
+        ret = type(self)(self.num_rows, self.num_cols, self.next_player, self.grid[:])
+        if self.weights is not None:
+            ret.set_weights(self.weights)
+        return ret
+
+    @property
+    def key(self) -> int:
+        """
+        Zobrist key of the position and the next player
+        """
+        return self._key
+
+    def set_weights(self, weights: Weights) -> None:
+        """
+        Starts keeping score with weights
+        Integer weights keep it exact, other floats can drift as actions are
+        executed and undone
+        """
+        self.weights = weights
+        self.score = sum(weights[v][i] for i, v in enumerate(self.grid))
+
+    def canonical_key(self) -> Tuple[int, Symmetry]:
+        """
+        Smallest key of the symmetric images of the position, and the symmetry
+        that gives that image
+        Positions that are images of each other have the same canonical key,
+        results found in the image hold here through the symmetry
+        Computed from the pieces on every call, only the plain key is kept up
+        to date by the actions
+        """
+        geometry = self.geometry
+        packed = geometry.image_swapped
+        if self.next_player == 2:
+            packed ^= geometry.image_side
+        image_zobrist = geometry.image_zobrist
+        for i, v in enumerate(self.grid):
+            if v:
+                packed ^= image_zobrist[i][v]
+
+        symmetries = geometry.symmetries
+        size = KEY_BITS // 8 * len(symmetries)
+        keys = memoryview(packed.to_bytes(size, sys.byteorder)).cast("Q").tolist()
+        best = min(keys)
+        return best, symmetries[keys.index(best)]
 
     def is_valid_pos(self, x: int, y: int) -> bool:
         """
@@ -71,6 +331,7 @@ class Board:
     def set_piece(self, x: int, y: int, val: int) -> None:
         """
         Sets piece at x, y to value x
+        Doesn't update the piece counts
         """
         if not self.is_valid_pos(x, y):
             raise IndexError(f"No such piece x:{x} y:{y}")
@@ -83,81 +344,241 @@ class Board:
         """
         self.grid[(y * self.num_cols) + x] = val
 
-    def _get_actions_inner(
-        self, x: int, y: int, dirs: List[Tuple[int, int]]
-    ) -> List[Action]:
+    def get_piece_codes(self, x: int, y: int) -> List[int]:
         """
-        Utility function to calculate valid actions for a piece at x, y
-        in the direction dirs
+        Get valid encoded actions for a particular piece
         """
-        ret = []
-        for dir in dirs:
-            x2 = x + dir[0]
-            y2 = y + dir[1]
-            if (
-                not self.is_valid_pos(x2, y2)
-                or self.get_piece_unchecked(x2, y2) == self.next_player
-            ):
+        i = (y * self.num_cols) + x
+        grid = self.grid
+
+        ret: List[int] = []
+        eats: List[int] = []
+        for n, land in self.geometry.links[i]:
+            target = grid[n]
+            if target == 0:
+                ret.append(i | n << 8)
+            elif target != self.next_player and land >= 0 and grid[land] == 0:
+                eats.append(i | land << 8 | (n + 1) << 16)
+
+        return eats or ret
+
+    def get_piece_actions(self, x: int, y: int) -> List[Action]:
+        """
+        Get valid actions for a particular piece
+        """
+        return [self.decode(code) for code in self.get_piece_codes(x, y)]
+
+    def get_capture_codes(self) -> List[int]:
+        """
+        Get only the encoded eats for the current player
+        """
+        grid = self.grid
+        jumps = self.geometry.jumps
+        player = self.next_player
+        opponent = 3 - player
+
+        ret: List[int] = []
+        for i, v in enumerate(grid):
+            if v != player:
                 continue
-            elif self.get_piece_unchecked(x2, y2) == 0:
-                ret.append(Move((x, y), (x2, y2), self))
-            elif (
-                self.is_valid_pos(dx := x + 2 * dir[0], dy := y + 2 * dir[1])
-                and self.get_piece_unchecked(dx, dy) == 0
-            ):
-                ret.append(Eat((x, y), (x2, y2), (dx, dy), self))
-
-        eats: List[Action] = [action for action in ret if isinstance(action, Eat)]
-        if len(eats) != 0:
-            return eats
+
+            for n, land in jumps[i]:
+                if grid[n] == opponent and grid[land] == 0:
+                    ret.append(i | land << 8 | (n + 1) << 16)
+
         return ret
 
-    def even_actions(self, x: int, y: int) -> List[Action]:
+    def iter_capture_codes(self) -> Iterator[int]:
         """
-        Returns actions for even pieces
-        Odd + Diagonals
+        Same eats as get_capture_codes, found one at a time
+        The board can change between two of them if it is restored before
         """
-        dirs = [(-1, -1), (1, 1), (-1, 1), (1, -1)]
-        odd = self.odd_actions(x, y)
-        return odd + self._get_actions_inner(x, y, dirs)
+        grid = self.grid
+        jumps = self.geometry.jumps
+        player = self.next_player
+        opponent = 3 - player
+
+        for i in range(len(grid)):
+            if grid[i] != player:
+                continue
 
-    def odd_actions(self, x: int, y: int) -> List[Action]:
+            for n, land in jumps[i]:
+                if grid[n] == opponent and grid[land] == 0:
+                    yield i | land << 8 | (n + 1) << 16
+
+    def get_chain_codes(self) -> List[int]:
         """
-        Returns actions for odd pieces
-        Up Down Left Right
+        Get the encoded eats for the current player as whole capture chains
+        Every chain keeps eating until the piece can't eat anymore
         """
-        dirs = [(-1, 0), (1, 0), (0, 1), (0, -1)]
-        return self._get_actions_inner(x, y, dirs)
+        ret: List[int] = []
+        player = self.next_player
+        for i, v in enumerate(self.grid):
+            if v == player and self._can_eat_from(i):
+                self._extend_chain(i | i << 8, i, 16, ret)
+        return ret
 
-    def get_piece_actions(self, x: int, y: int):
+    def _extend_chain(self, code: int, cur: int, shift: int, ret: List[int]) -> None:
         """
-        Get valid actions for a particular piece
+        Appends to ret every longest continuation of the chain in code
+        The piece is at cur and the next eaten cell goes at shift
         """
-        if (x + y) % 2 == 0:
-            return self.even_actions(x, y)
-        else:
-            return self.odd_actions(x, y)
+        grid = self.grid
+        t = grid[cur]
+        extended = False
+        for n, land in self.geometry.jumps[cur]:
+            if grid[n] != 3 - t or grid[land] != 0:
+                continue
 
-    def get_valid_actions(self) -> List[Action]:
+            extended = True
+            grid[cur] = grid[n] = 0
+            grid[land] = t
+            self._extend_chain(
+                (code & ~0xFF00) | land << 8 | (n + 1) << shift, land, shift + 8, ret
+            )
+            grid[land] = 0
+            grid[cur], grid[n] = t, 3 - t
+
+        if not extended:
+            ret.append(code)
+
+    def get_valid_codes(self, chains: bool = False) -> List[int]:
         """
-        Get all actions for the current player
+        Get all encoded actions for the current player
+        Eats are mandatory so moves are only generated when there are none
+        With chains every eat is a whole capture chain and always ends the turn
         """
-        ret = []
-        for x in range(self.num_cols):
-            for y in range(self.num_rows):
-                if self.get_piece(x, y) != self.next_player:
-                    continue
-
-                if (x + y) % 2 == 0:
-                    ret += self.even_actions(x, y)
-                else:
-                    ret += self.odd_actions(x, y)
-
-        eats: List[Action] = [action for action in ret if isinstance(action, Eat)]
-        if len(eats) != 0:
-            return eats
+        ret = self.get_chain_codes() if chains else self.get_capture_codes()
+        if ret:
+            return ret
+
+        grid = self.grid
+        links = self.geometry.links
+        player = self.next_player
+        for i, v in enumerate(grid):
+            if v != player:
+                continue
+
+            for n, _ in links[i]:
+                if grid[n] == 0:
+                    ret.append(i | n << 8)
+
         return ret
 
+    def get_valid_actions(self, chains: bool = False) -> List[Action]:
+        """
+        Get all actions for the current player
+        """
+        return [self.decode(code) for code in self.get_valid_codes(chains)]
+
+    def decode(self, code: int) -> Action:
+        """
+        Returns the action object of an encoded action
+        """
+        coords = self.geometry.coords
+        if code >> 24:
+            return EatChain(code, self)
+        if code >> 16:
+            return Eat(
+                coords[code & 0xFF],
+                coords[(code >> 16) - 1],
+                coords[code >> 8 & 0xFF],
+                self,
+            )
+        return Move(coords[code & 0xFF], coords[code >> 8 & 0xFF], self)
+
+    def has_capture(self, x: int, y: int) -> bool:
+        """
+        Whether the piece at x, y can eat
+        """
+        return self._can_eat_from((y * self.num_cols) + x)
+
+    def has_any_capture(self) -> bool:
+        """
+        Whether the current player can eat, stops at the first eat found
+        """
+        player = self.next_player
+        for i, v in enumerate(self.grid):
+            if v == player and self._can_eat_from(i):
+                return True
+        return False
+
+    def _can_eat_from(self, i: int) -> bool:
+        """
+        Whether the piece at cell i can eat
+        """
+        grid = self.grid
+        opponent = 3 - grid[i]
+        for n, land in self.geometry.jumps[i]:
+            if grid[n] == opponent and grid[land] == 0:
+                return True
+        return False
+
+    def make(self, code: int) -> None:
+        """
+        Executes an encoded action
+        The turn only stays with the player if the piece that ate can eat again
+        """
+        grid = self.grid
+        zobrist = self.geometry.zobrist
+        source = code & 0xFF
+        dest = code >> 8 & 0xFF
+
+        t = grid[source]
+        grid[source] = 0
+        grid[dest] = t
+        self._key ^= zobrist[source][t] ^ zobrist[dest][t]
+        weights = self.weights
+        if weights is not None:
+            self.score += weights[t][dest] - weights[t][source]
+
+        eaten = code >> 16
+        if eaten:
+            while eaten:
+                target = (eaten & 0xFF) - 1
+                grid[target] = 0
+                self.counts[3 - t] -= 1
+                self._key ^= zobrist[target][3 - t]
+                if weights is not None:
+                    self.score -= weights[3 - t][target]
+                eaten >>= 8
+            if self._can_eat_from(dest):
+                return
+
+        self.next_player = 3 - self.next_player
+        self._key ^= self.geometry.zobrist_side
+
+    def unmake(self, code: int) -> None:
+        """
+        Undoes an encoded action, it must be the last one executed
+        """
+        grid = self.grid
+        zobrist = self.geometry.zobrist
+        source = code & 0xFF
+        dest = code >> 8 & 0xFF
+
+        t = grid[dest]
+        grid[dest] = 0
+        grid[source] = t
+        self._key ^= zobrist[source][t] ^ zobrist[dest][t]
+        weights = self.weights
+        if weights is not None:
+            self.score += weights[t][source] - weights[t][dest]
+
+        eaten = code >> 16
+        while eaten:
+            target = (eaten & 0xFF) - 1
+            grid[target] = 3 - t
+            self.counts[3 - t] += 1
+            self._key ^= zobrist[target][3 - t]
+            if weights is not None:
+                self.score += weights[3 - t][target]
+            eaten >>= 8
+
+        if self.next_player != t:
+            self.next_player = t
+            self._key ^= self.geometry.zobrist_side
+
     def is_terminal(self) -> Literal[0, 1, 2, 3]:
         """
         Get game result
@@ -167,31 +588,13 @@ class Board:
         3 - Draw
         """
 
-        # 0-continue, 1- P1 win 2- P2 win 3- Draw
-        count1 = count2 = 0
-
-        # TODO: Maybe cache this?
-        for v in self.grid:
-            if v == 1:
-                count1 += 1
-            elif v == 2:
-                count2 += 1
+        count1, count2 = self.counts[1], self.counts[2]
 
         if count1 == 0:
             return 2
         elif count2 == 0:
             return 1
-        elif (
-            count1 == count2 == 1
-            and len(
-                [
-                    action
-                    for action in self.get_valid_actions()
-                    if isinstance(action, Eat)
-                ]
-            )
-            == 0
-        ):
+        elif count1 == count2 == 1 and not self.has_any_capture():
             return 3
 
         return 0
@@ -215,23 +618,18 @@ class Move:
     source: Tuple[int, int]
     dest: Tuple[int, int]
     board: Board
-    change_player: bool = True
 
-    def execute(self):
-        t = self.board.get_piece(self.source[0], self.source[1])
-        self.board.set_piece(self.source[0], self.source[1], 0)
-        self.board.set_piece(self.dest[0], self.dest[1], t)
+    def code(self) -> int:
+        cols = self.board.num_cols
+        return encode_move(
+            self.source[1] * cols + self.source[0], self.dest[1] * cols + self.dest[0]
+        )
 
-        if self.change_player:
-            self.board.next_player = 3 - self.board.next_player
+    def execute(self):
+        self.board.make(self.code())
 
     def undo(self):
-        t = self.board.get_piece(self.dest[0], self.dest[1])
-        self.board.set_piece(self.dest[0], self.dest[1], 0)
-        self.board.set_piece(self.source[0], self.source[1], t)
-
-        if self.change_player:
-            self.board.next_player = 3 - self.board.next_player
+        self.board.unmake(self.code())
 
     def get_piece(self) -> Tuple[int, int]:
         return self.source
@@ -248,21 +646,20 @@ class Eat:
     board: Board
     changed_turn: bool = False
 
-    def execute(self):
-        Move(self.hunter, self.dest, self.board, change_player=False).execute()
-        self.board.set_piece(self.target[0], self.target[1], 0)
+    def code(self) -> int:
+        cols = self.board.num_cols
+        return encode_eat(
+            self.hunter[1] * cols + self.hunter[0],
+            self.target[1] * cols + self.target[0],
+            self.dest[1] * cols + self.dest[0],
+        )
 
-        if not self.killing_streak():
-            self.board.next_player = 3 - self.board.next_player
-            self.changed_turn = True
+    def execute(self):
+        self.board.make(self.code())
+        self.changed_turn = not self.killing_streak()
 
     def undo(self):
-        t = 3 - self.board.get_piece(self.dest[0], self.dest[1])
-        Move(self.hunter, self.dest, self.board, change_player=False).undo()
-        self.board.set_piece(self.target[0], self.target[1], t)
-
-        if self.changed_turn:
-            self.board.next_player = 3 - self.board.next_player
+        self.board.unmake(self.code())
 
     def get_piece(self) -> Tuple[int, int]:
         return self.hunter
@@ -275,17 +672,30 @@ class Eat:
         caso peça jogada ainda poder comer
         o jogador continua a jogar com esse mesmo objeto
         """
+        return self.board.has_capture(self.dest[0], self.dest[1])
 
-        return (
-            len(
-                [
-                    ac
-                    for ac in self.board.get_piece_actions(self.dest[0], self.dest[1])
-                    if isinstance(ac, Eat)
-                ]
-            )
-            > 0
-        )
+
+@dataclass
+class EatChain:
+    """
+    Several eats in a row by the same piece done as a single action
+    """
+
+    code: int
+    board: Board
+    changed_turn: bool = True
+
+    def execute(self):
+        self.board.make(self.code)
+
+    def undo(self):
+        self.board.unmake(self.code)
+
+    def get_piece(self) -> Tuple[int, int]:
+        return self.board.geometry.coords[self.code & 0xFF]
+
+    def get_dest(self) -> Tuple[int, int]:
+        return self.board.geometry.coords[self.code >> 8 & 0xFF]
 
 
 def initial_board(num_rows: int, num_cols: int) -> List[int]:
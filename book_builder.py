@@ -0,0 +1,90 @@
+import argparse
+from typing import Callable, Dict, List, Type
+from board import Board, transform_code
+from eval_fncs import eval_1
+from game import best_root_moves, minimax_with_transposition, search_root
+from opening_book import write_book
+from state import State
+from transposition import TranspositionTable
+
+
+def build(
+    num_rows: int,
+    num_cols: int,
+    plies: int,
+    depth: int,
+    path: str,
+    evaluate_func: Callable[[State], float] = eval_1,
+    search: Callable = minimax_with_transposition,
+    chains: bool = False,
+    board_type: Type[Board] = Board,
+    symmetric: bool = False,
+) -> int:
+    """
+    Searches every position up to plies actions from the initial board
+    depth actions deep and writes the best actions to path
+    With symmetric only one position of every set of symmetric ones is
+    searched, evaluate_func must score them the same
+    Returns the number of positions in the book
+    """
+    table = TranspositionTable(symmetric=symmetric)
+    book: Dict[int, List[int]] = {}
+    frontier = [board_type(num_rows, num_cols)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for board in frontier:
+            symmetry = None
+            if symmetric:
+                key, symmetry = board.canonical_key()
+            else:
+                key = board.key
+            if key in book or board.is_terminal() != 0:
+                continue
+            actions = board.get_valid_codes(chains)
+            if len(actions) == 0:
+                continue
+
+            # Positions with one action are played right away
+            book[key] = []
+            if len(actions) > 1:
+                state = State(board, transposition_table=table)
+                best_moves = best_root_moves(
+                    search_root(search, state, depth, evaluate_func, chains)
+                )
+                if symmetry is not None:
+                    best_moves = [
+                        transform_code(move, symmetry.cells) for move in best_moves
+                    ]
+                book[key] = best_moves
+
+            if ply < plies:
+                for move in actions:
+                    child = board.copy()
+                    child.make(move)
+                    next_frontier.append(child)
+        frontier = next_frontier
+
+    write_book(path, num_rows, num_cols, chains, book, symmetric)
+    return sum(1 for moves in book.values() if moves)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--cols", type=int, default=5)
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--chains", action="store_true")
+    parser.add_argument("--symmetric", action="store_true")
+    args = parser.parse_args()
+    positions = build(
+        args.rows,
+        args.cols,
+        args.plies,
+        args.depth,
+        args.path,
+        chains=args.chains,
+        symmetric=args.symmetric,
+    )
+    print(f"{positions} positions")
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from typing import Callable
+from state import State
+
+
+class EvalCache:
+    """
+    Evaluation function that remembers the scores of the positions it has
+    seen, keyed by board key
+    Holds up to max_entries scores, the least recently used is dropped first
+    Wraps any evaluation function of a State and is used the same way, the
+    scores are kept across searches and moves while the object lives
+    """
+
+    def __init__(
+        self, evaluate_func: Callable[[State], float], max_entries: int = 1 << 20
+    ) -> None:
+        assert max_entries > 0, "The cache must hold at least one score"
+        self.evaluate_func = evaluate_func
+        self.max_entries = max_entries
+        # Same name and code as the wrapped function (see evaluator_name)
+        self.__wrapped__ = evaluate_func
+        self.scores: OrderedDict[int, float] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, state: State) -> float:
+        key = state.board.key
+        scores = self.scores
+        score = scores.get(key)
+        if score is not None:
+            scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+        self.misses += 1
+        score = self.evaluate_func(state)
+        scores[key] = score
+        if len(scores) > self.max_entries:
+            scores.popitem(last=False)
+        return score
+
+    def __reduce__(self):
+        # Other processes start with an empty cache instead of a copy
+        return (EvalCache, (self.evaluate_func, self.max_entries))
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        self.scores.clear()
+        self.hits = 0
+        self.misses = 0
@@ -1,3 +1,6 @@
+from functools import lru_cache
+from linear_eval import LinearEval, border, material
+from position import Position
 from state import State
 
 
@@ -6,14 +9,7 @@ def eval_1(state: State) -> float:
     Difference between player 1 pieces and player 2 pieces
     """
 
-    count1 = count2 = 0
-    for v in state.board.grid:
-        if v == 1:
-            count1 += 1
-        elif v == 2:
-            count2 += 1
-
-    return count1 - count2
+    return state.board.counts[1] - state.board.counts[2]
 
 
 def eval_2(state: State):
@@ -49,3 +45,36 @@ def eval_2(state: State):
             count2 += 1
 
     return count1 - count2
+
+
+# eval_1 and eval_2 as weight tables, kept up to date by the actions
+linear_eval_1 = LinearEval((1.0, material))
+linear_eval_2 = LinearEval((1.0, border))
+
+
+@lru_cache(maxsize=None)
+def border_mask(num_rows: int, num_cols: int) -> int:
+    """
+    Bitmask of the border cells
+    """
+    ret = 0
+    for y in range(num_rows):
+        for x in range(num_cols):
+            if x in (0, num_cols - 1) or y in (0, num_rows - 1):
+                ret |= 1 << (y * num_cols + x)
+    return ret
+
+
+def position_eval_1(position: Position) -> float:
+    """
+    eval_1 for immutable positions
+    """
+    return position.bits1.bit_count() - position.bits2.bit_count()
+
+
+def position_eval_2(position: Position) -> float:
+    """
+    eval_2 for immutable positions
+    """
+    border = border_mask(position.num_rows, position.num_cols)
+    return (position.bits1 & border).bit_count() - (position.bits2 & border).bit_count()
@@ -1,12 +1,29 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import math
 import time
 import random
 import pygame
 from eval_fncs import eval_1
+from search_stats import SearchStats
 from state import State
-from typing import Callable
+from position import Position, apply, is_terminal, valid_codes
+from batch_eval import BatchEval, grids_to_array
+from ordering import MoveOrderer
+from opening_book import OpeningBook
+from tablebase import Tablebase
+from transposition import (
+    CHOOSER_KEY,
+    EXACT,
+    LOWER,
+    OPPOSITE,
+    UPPER,
+    FileTranspositionTable,
+    TranspositionTable,
+    search_salt,
+)
+from typing import Callable, List, Tuple
 from typing_extensions import Self
-from board import Board, Eat
+from board import Eat, transform_code
 from gui import Renderer
 from constants import MAX_TURNS
 
@@ -26,22 +43,64 @@ class Game:
     player1_AI_name: str = "Player 1"
     player2_AI_name: str = "Player 2"
 
+    # Size of the transposition table of every new game
+    tt_size_mb: float = 16
+    # Symmetric positions share the entries of that table, only for engines
+    # whose evaluation functions score them the same (see TranspositionTable)
+    symmetric_tt: bool = False
+    # Used by every game instead of a new table, see FileTranspositionTable
+    persistent_table: FileTranspositionTable | None = None
+
+    # Stats of the last engine move, and of every engine move of the game and
+    # of the match by player (index 0 is unused)
+    search_stats: SearchStats = field(default_factory=SearchStats)
+    game_stats: List[SearchStats] = field(default_factory=list)
+    match_stats: List[SearchStats] = field(default_factory=list)
+
+    # Engines play their moves instead of searching the positions in them
+    opening_book: OpeningBook | None = None
+    tablebase: Tablebase | None = None
+
+    @property
+    def search_depth(self) -> int:
+        """
+        Depth reached by the last engine move
+        """
+        return self.search_stats.depth
+
     def start(self, log_mov=False) -> int:
         """
         Start a new game
         """
-        self.state = State(Board(self.state.board.num_rows, self.state.board.num_cols))
+        board_type = type(self.state.board)
+        table = self.persistent_table
+        if table is None:
+            table = TranspositionTable(self.tt_size_mb, self.symmetric_tt)
+        self.state = State(
+            board_type(self.state.board.num_rows, self.state.board.num_cols),
+            transposition_table=table,
+        )
 
         if self.renderer:
             self.renderer.render(self.state)
             pygame.time.wait(500)
 
+        self.game_stats = [SearchStats() for _ in range(3)]
         result = -1
         while True:
-            if self.state.board.next_player == 1:
+            player = self.state.board.next_player
+            self.state.stats = SearchStats()
+            start_ns = time.perf_counter_ns()
+            if player == 1:
                 did_action = self.player1_AI(self)
             else:
                 did_action = self.player2_AI(self)
+            stats = self.state.stats
+            stats.elapsed_ns = time.perf_counter_ns() - start_ns
+            if did_action and stats.nodes > 0:
+                stats.searches = 1
+                self.search_stats = stats
+                self.game_stats[player].add(stats)
 
             if self.renderer:
                 self.renderer.render(self.state)
@@ -81,6 +140,7 @@ class Game:
         start_time = time.time()
 
         results = [0, 0, 0]  # [player 1 victories, player 2 victories, draws]
+        self.match_stats = [SearchStats() for _ in range(3)]
 
         turns = []
         remaining = n
@@ -89,12 +149,14 @@ class Game:
             result = self.start(log_moves)
             results[result - 1] += 1
             turns.append(self.state.cur_hist)
+            for player in (1, 2):
+                self.match_stats[player].add(self.game_stats[player])
 
         # Statistics
-        elapsed = int(time.time() - start_time)
+        elapsed = time.time() - start_time
         turns_avg = sum(turns) / (n - remaining)
 
-        print("\n=== Elapsed time: %s seconds ===" % (elapsed))
+        print("\n=== Elapsed time: %.2f seconds ===" % (elapsed))
         print(f"  Matches played: {n-remaining}")
         print()
         print(f"  {self.player1_AI_name}: {results[0]} victories")
@@ -109,35 +171,79 @@ class Game:
         print()
         print(f"  AVG time per game: {elapsed/(n-remaining):.2f} s")
         print(f"  AVG time per turn: {elapsed/sum(turns):.2f} s")
+        print()
+        for player, name in ((1, self.player1_AI_name), (2, self.player2_AI_name)):
+            stats = self.match_stats[player]
+            if stats.searches > 0:
+                print(f"  {name} search: {stats}")
 
         print("===============================")
         # --------------------------------------------------#
 
 
+def play_known_move(game: Game, chains: bool = False) -> bool:
+    """
+    Plays a move of the opening book or the tablebase when the position is
+    in one of them
+    Returns whether a move was played
+    """
+    board = game.state.board
+    book = game.opening_book
+    if book is not None and book.chains == chains:
+        moves = book.lookup(board)
+        if moves:
+            game.state.execute(board.decode(random.choice(moves)))
+            return True
+
+    tablebase = game.tablebase
+    if tablebase is None or tablebase.chains != chains:
+        return False
+    if board.counts[1] + board.counts[2] > tablebase.max_pieces:
+        return False
+
+    moves = tablebase.best_moves(Position.from_board(board))
+    if not moves:
+        return False
+    game.state.execute(board.decode(random.choice(moves)))
+    return True
+
+
 def execute_random_move(game: Game) -> bool:
-    move = random.choice(game.state.board.get_valid_actions())
-    game.state.execute(move)
+    board = game.state.board
+    game.state.execute(board.decode(random.choice(board.get_valid_codes())))
     return True
 
 
 def execute_minimax_move(
-    evaluate_func: Callable[[State], float], depth: int
+    evaluate_func: Callable[[State], float],
+    depth: int,
+    chains: bool = False,
+    ordering: bool = False,
 ) -> Callable[[Game], bool]:
+    orderer = MoveOrderer() if ordering else None
+
     def execute_minimax_move_aux(game: Game) -> bool:
         """
         updates the game state to the best possible move (uses minimax to determine it)
         """
         best_moves = []
         best_eval = float("-inf")
-        actions = game.state.board.get_valid_actions()
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
         if len(actions) == 1:
             # There isn't much to do and this can take a longggggg time
-            game.state.execute(actions[0])
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
             return True
 
         player = game.state.board.next_player
+        if orderer is not None:
+            orderer.new_move(game.state.cur_hist)
+            orderer.new_search(depth)
         for move in actions:
-            game.state.execute(move)
+            board.make(move)
             new_state_eval = minimax(
                 game.state,
                 depth - 1,
@@ -146,16 +252,19 @@ def execute_minimax_move(
                 False,
                 player,
                 evaluate_func,
+                chains,
+                orderer,
             )
-            game.state.undo()
+            board.unmake(move)
             if new_state_eval > best_eval:
                 best_moves = [move]
                 best_eval = new_state_eval
             elif new_state_eval == best_eval:
                 best_moves.append(move)
 
+        game.state.stats.depth = depth
         assert len(best_moves) != 0, f"Board has no valid actions {game.state.board}"
-        game.state.execute(random.choice(best_moves))
+        game.state.execute(board.decode(random.choice(best_moves)))
         return True
 
     return execute_minimax_move_aux
@@ -169,154 +278,416 @@ def minimax(
     maximizing: bool,
     player: int,
     evaluate_func: Callable[[State], float],
+    chains: bool = False,
+    orderer: MoveOrderer | None = None,
 ) -> float:
+    stats = state.stats
+    stats.nodes += 1
     if depth == 0 or state.board.is_terminal() != 0:
+        stats.leaves += 1
         return evaluate_func(state) * (1 if player == 1 else -1)
 
+    moves = state.board.get_valid_codes(chains)
+    if orderer is not None:
+        moves = orderer.order(moves, depth)
+
     if maximizing:
         max_eval = float("-inf")
-        for move in state.board.get_valid_actions():
-            state.execute(move)
-            eval = minimax(state, depth - 1, alpha, beta, False, player, evaluate_func)
-            state.undo()
+        for i, move in enumerate(moves):
+            state.board.make(move)
+            eval = minimax(
+                state,
+                depth - 1,
+                alpha,
+                beta,
+                False,
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+            )
+            state.board.unmake(move)
             max_eval = max(max_eval, eval)
             alpha = max(alpha, eval)
             if beta <= alpha:
+                stats.cutoff(i)
+                if orderer is not None:
+                    orderer.cutoff(move, depth)
                 break
         return max_eval
     else:
         min_eval = float("inf")
-        for move in state.board.get_valid_actions():
-            state.execute(move)
-            eval = minimax(state, depth - 1, alpha, beta, True, player, evaluate_func)
-            state.undo()
+        for i, move in enumerate(moves):
+            state.board.make(move)
+            eval = minimax(
+                state,
+                depth - 1,
+                alpha,
+                beta,
+                True,
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+            )
+            state.board.unmake(move)
             min_eval = min(min_eval, eval)
             beta = min(beta, eval)
             if beta <= alpha:
+                stats.cutoff(i)
+                if orderer is not None:
+                    orderer.cutoff(move, depth)
                 break
         return min_eval
 
 
-def execute_minimax_move_with_transposition(
-    evaluate_func: Callable[[State], float], max_depth: int
+def execute_minimax_batched_move(
+    batch_evaluate_func: BatchEval,
+    depth: int,
+    chains: bool = False,
+    ordering: bool = False,
 ) -> Callable[[Game], bool]:
-    def execute_minimax_move_aux_with_transposition(game: Game) -> bool:
+    orderer = MoveOrderer() if ordering else None
+
+    def execute_minimax_batched_move_aux(game: Game) -> bool:
         """
-        updates the game state to the best possible move (uses minimax to determine it)
+        updates the game state to the best possible move
+        (uses minimax with batched leaf evaluation to determine it)
         """
         best_moves = []
         best_eval = float("-inf")
-        for depth in range(1, max_depth):
-            actions = game.state.board.get_valid_actions()
-            if len(actions) == 1:
-                # There isn't much to do and this can take a longggggg time
-                game.state.execute(actions[0])
-                return True
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
 
-            player = game.state.board.next_player
-            for move in actions:
-                game.state.execute(move)
-                new_state_eval = minimax_with_transposition(
-                    game.state,
-                    depth - 1,
-                    float("-inf"),
-                    float("+inf"),
-                    False,
-                    player,
-                    evaluate_func,
-                )
-                game.state.undo()
-                if new_state_eval > best_eval:
-                    best_moves = [move]
-                    best_eval = new_state_eval
-                elif new_state_eval == best_eval:
-                    best_moves.append(move)
+        if play_known_move(game, chains):
+            return True
+
+        player = board.next_player
+        if orderer is not None:
+            orderer.new_move(game.state.cur_hist)
+            orderer.new_search(depth)
+        for move in actions:
+            board.make(move)
+            new_state_eval = minimax_batched(
+                game.state,
+                depth - 1,
+                float("-inf"),
+                float("+inf"),
+                False,
+                player,
+                batch_evaluate_func,
+                chains,
+                orderer,
+            )
+            board.unmake(move)
+            if new_state_eval > best_eval:
+                best_moves = [move]
+                best_eval = new_state_eval
+            elif new_state_eval == best_eval:
+                best_moves.append(move)
 
+        game.state.stats.depth = depth
         assert len(best_moves) != 0, f"Board has no valid actions {game.state.board}"
-        game.state.execute(random.choice(best_moves))
+        game.state.execute(board.decode(random.choice(best_moves)))
         return True
 
-    return execute_minimax_move_aux_with_transposition
+    return execute_minimax_batched_move_aux
 
 
-def minimax_with_transposition(
+def minimax_batched(
     state: State,
     depth: int,
     alpha: float,
     beta: float,
     maximizing: bool,
     player: int,
-    evaluate_func: Callable[[State], float],
+    batch_evaluate_func: BatchEval,
+    chains: bool = False,
+    orderer: MoveOrderer | None = None,
 ) -> float:
-    if depth == 0 or state.board.is_terminal() != 0:
-        return evaluate_func(state) * (1 if player == 1 else -1)
+    """
+    minimax that scores all the children of the last ply in one batch
+    """
+    board = state.board
+    sign = 1 if player == 1 else -1
+    stats = state.stats
+    stats.nodes += 1
+    if depth == 0 or board.is_terminal() != 0:
+        stats.leaves += 1
+        grids = grids_to_array([board.grid])
+        return (
+            float(batch_evaluate_func(grids, board.num_rows, board.num_cols)[0]) * sign
+        )
 
-    board_hash = hash(state.board)
-    if board_hash in state.transposition_table:
-        actions = state.transposition_table[board_hash]
-    else:
-        actions = (state.board.get_valid_actions(), 0)
+    if depth == 1:
+        children = []
+        for move in board.get_valid_codes(chains):
+            board.make(move)
+            children.append(board.grid[:])
+            board.unmake(move)
+
+        if len(children) == 0:
+            return float("-inf") if maximizing else float("inf")
+        stats.nodes += len(children)
+        stats.leaves += len(children)
+
+        evals = sign * batch_evaluate_func(
+            grids_to_array(children), board.num_rows, board.num_cols
+        )
+        return float(evals.max() if maximizing else evals.min())
+
+    moves = board.get_valid_codes(chains)
+    if orderer is not None:
+        moves = orderer.order(moves, depth)
 
     if maximizing:
         max_eval = float("-inf")
-        evals = []
-        for move in actions[0]:
-            state.execute(move)
-            eval = minimax_with_transposition(
-                state, depth - 1, alpha, beta, False, player, evaluate_func
+        for i, move in enumerate(moves):
+            board.make(move)
+            eval = minimax_batched(
+                state,
+                depth - 1,
+                alpha,
+                beta,
+                False,
+                player,
+                batch_evaluate_func,
+                chains,
+                orderer,
             )
-            state.undo()
-            evals.append((move, eval))
+            board.unmake(move)
             max_eval = max(max_eval, eval)
             alpha = max(alpha, eval)
             if beta <= alpha:
+                stats.cutoff(i)
+                if orderer is not None:
+                    orderer.cutoff(move, depth)
                 break
-
-        evals.sort(key=lambda x: x[1], reverse=True)
-        if actions[1] < depth:
-            state.transposition_table[board_hash] = ([eval[0] for eval in evals], depth)
-
         return max_eval
     else:
         min_eval = float("inf")
-        evals = []
-        for move in reversed(actions[0]):
-            state.execute(move)
-            eval = minimax_with_transposition(
-                state, depth - 1, alpha, beta, True, player, evaluate_func
+        for i, move in enumerate(moves):
+            board.make(move)
+            eval = minimax_batched(
+                state,
+                depth - 1,
+                alpha,
+                beta,
+                True,
+                player,
+                batch_evaluate_func,
+                chains,
+                orderer,
             )
-            state.undo()
-            evals.append((move, eval))
+            board.unmake(move)
             min_eval = min(min_eval, eval)
             beta = min(beta, eval)
             if beta <= alpha:
+                stats.cutoff(i)
+                if orderer is not None:
+                    orderer.cutoff(move, depth)
                 break
+        return min_eval
 
-        evals.sort(key=lambda x: x[1])
-        if actions[1] < depth:
-            state.transposition_table[board_hash] = ([eval[0] for eval in evals], depth)
 
-        return min_eval
+def execute_minimax_move_with_transposition(
+    evaluate_func: Callable[[State], float],
+    max_depth: int,
+    chains: bool = False,
+    ordering: bool = False,
+) -> Callable[[Game], bool]:
+    orderer = MoveOrderer() if ordering else None
+
+    def execute_minimax_move_aux_with_transposition(game: Game) -> bool:
+        """
+        updates the game state to the best possible move (uses minimax to determine it)
+        """
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
+            return True
+
+        salt = search_salt(evaluate_func, chains)
+        game.state.transposition_table.new_search()
+        if orderer is not None:
+            orderer.new_move(game.state.cur_hist)
+        best_moves = []
+        for depth in range(1, max_depth):
+            # Only the deepest iteration decides
+            best_moves = best_root_moves(
+                search_root(
+                    minimax_with_transposition,
+                    game.state,
+                    depth,
+                    evaluate_func,
+                    chains,
+                    salt,
+                    orderer,
+                )
+            )
+            game.state.stats.depth = depth
+
+        assert len(best_moves) != 0, f"Board has no valid actions {game.state.board}"
+        game.state.execute(board.decode(random.choice(best_moves)))
+        return True
+
+    return execute_minimax_move_aux_with_transposition
+
+
+def minimax_with_transposition(
+    state: State,
+    depth: int,
+    alpha: float,
+    beta: float,
+    maximizing: bool,
+    player: int,
+    evaluate_func: Callable[[State], float],
+    chains: bool = False,
+    salt: int = 0,
+    orderer: MoveOrderer | None = None,
+) -> float:
+    """
+    minimax that stores its results in state.transposition_table
+    Stored bounds can end the search of a node right away
+    salt keeps the entries of different searches apart (see search_salt)
+    Tables made with symmetric store entries for the canonical image of the
+    position so symmetric positions share them, evaluate_func must then give
+    images the same score (negated when the image swaps the players)
+    """
+    sign = 1 if player == 1 else -1
+    board = state.board
+    stats = state.stats
+    stats.nodes += 1
+    if depth == 0 or board.is_terminal() != 0:
+        stats.leaves += 1
+        return evaluate_func(state) * sign
+
+    table = state.transposition_table
+    symmetry = None
+    if table.symmetric:
+        board_hash, symmetry = board.canonical_key()
+    else:
+        board_hash = board.key
+    board_hash ^= salt
+    swap = symmetry is not None and symmetry.swap
+    if (maximizing != (player == 1)) != swap:
+        board_hash ^= CHOOSER_KEY
+    # Entries are for player 1 of the image
+    table_sign = -sign if swap else sign
+
+    best_move = None
+    entry = table.probe(board_hash)
+    stats.tt_probes += 1
+    if entry is not None:
+        stats.tt_hits += 1
+        best_move = entry.move
+        if best_move is not None and symmetry is not None:
+            best_move = transform_code(best_move, symmetry.inverse)
+        if entry.depth >= depth:
+            score = entry.score * table_sign
+            flag = entry.flag if table_sign == 1 else OPPOSITE[entry.flag]
+            if flag == EXACT:
+                return score
+            elif flag == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if beta <= alpha:
+                return score
+
+    actions = board.get_valid_codes(chains)
+    if orderer is not None:
+        actions = orderer.order(actions, depth, best_move)
+    elif best_move in actions:
+        actions.remove(best_move)
+        actions.insert(0, best_move)
+
+    alpha_orig, beta_orig = alpha, beta
+    best_eval = float("-inf") if maximizing else float("inf")
+    for i, move in enumerate(actions):
+        board.make(move)
+        eval = minimax_with_transposition(
+            state,
+            depth - 1,
+            alpha,
+            beta,
+            not maximizing,
+            player,
+            evaluate_func,
+            chains,
+            salt,
+            orderer,
+        )
+        board.unmake(move)
+        if maximizing:
+            if eval > best_eval:
+                best_eval, best_move = eval, move
+            alpha = max(alpha, eval)
+        else:
+            if eval < best_eval:
+                best_eval, best_move = eval, move
+            beta = min(beta, eval)
+        if beta <= alpha:
+            stats.cutoff(i)
+            if orderer is not None:
+                orderer.cutoff(move, depth)
+            break
+
+    if best_eval <= alpha_orig:
+        flag = UPPER
+    elif best_eval >= beta_orig:
+        flag = LOWER
+    else:
+        flag = EXACT
+    if table_sign == -1:
+        flag = OPPOSITE[flag]
+    if best_move is not None and symmetry is not None:
+        best_move = transform_code(best_move, symmetry.cells)
+    table.store(board_hash, best_eval * table_sign, flag, depth, best_move)
+    stats.tt_stores += 1
+
+    return best_eval
 
 
 def execute_negamax_move(
-    evaluate_func: Callable[[State], float], depth: int
+    evaluate_func: Callable[[State], float],
+    depth: int,
+    chains: bool = False,
+    ordering: bool = False,
 ) -> Callable[[Game], bool]:
+    orderer = MoveOrderer() if ordering else None
+
     def execute_negamax_move_aux(game: Game) -> bool:
         """
         updates the game state to the best possible move (uses negamax to determine it)
         """
         best_moves = []
         best_eval = float("-inf")
-        actions = game.state.board.get_valid_actions()
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
         if len(actions) == 1:
             # There isn't much to do and this can take a longggggg time
-            game.state.execute(actions[0])
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
             return True
 
         player = game.state.board.next_player
+        if orderer is not None:
+            orderer.new_move(game.state.cur_hist)
+            orderer.new_search(depth)
         for move in actions:
-            game.state.execute(move)
+            board.make(move)
             new_state_eval = negamax(
                 game.state,
                 depth - 1,
@@ -324,16 +695,19 @@ def execute_negamax_move(
                 float("+inf"),
                 player,
                 evaluate_func,
+                chains,
+                orderer,
             )
-            game.state.undo()
+            board.unmake(move)
             if new_state_eval > best_eval:
                 best_moves = [move]
                 best_eval = new_state_eval
             elif new_state_eval == best_eval:
                 best_moves.append(move)
 
+        game.state.stats.depth = depth
         assert len(best_moves) != 0, f"Board has no valid actions {game.state.board}"
-        game.state.execute(random.choice(best_moves))
+        game.state.execute(board.decode(random.choice(best_moves)))
         return True
 
     return execute_negamax_move_aux
@@ -346,24 +720,537 @@ def negamax(
     beta: float,
     player: int,
     evaluate_func: Callable[[State], float],
+    chains: bool = False,
+    orderer: MoveOrderer | None = None,
 ) -> float:
+    stats = state.stats
+    stats.nodes += 1
     if depth == 0 or state.board.is_terminal() != 0:
+        stats.leaves += 1
         return evaluate_func(state) * (1 if player == 1 else -1)
 
+    moves = state.board.get_valid_codes(chains)
+    if orderer is not None:
+        moves = orderer.order(moves, depth)
+
     score = float("-inf")
-    for move in state.board.get_valid_actions():
-        state.execute(move)
+    for i, move in enumerate(moves):
+        state.board.make(move)
         score = max(
-            score, -negamax(state, depth - 1, -beta, -alpha, player, evaluate_func)
+            score,
+            -negamax(
+                state,
+                depth - 1,
+                -beta,
+                -alpha,
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+            ),
         )
-        state.undo()
+        state.board.unmake(move)
         alpha = max(alpha, score)
         if alpha > beta:
+            stats.cutoff(i)
+            if orderer is not None:
+                orderer.cutoff(move, depth)
             break
 
     return score
 
 
+def execute_pvs_move(
+    evaluate_func: Callable[[State], float],
+    depth: int,
+    chains: bool = False,
+    window: float = 1,
+    ordering: bool = True,
+) -> Callable[[Game], bool]:
+    """
+    Principal variation search deepened one ply at a time
+    Every iteration starts with an aspiration window of +-window around the
+    score of the previous one, and widens it when the score falls outside
+    """
+    orderer = MoveOrderer() if ordering else None
+
+    def execute_pvs_move_aux(game: Game) -> bool:
+        """
+        updates the game state to the best possible move (uses pvs to determine it)
+        """
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
+            return True
+
+        if orderer is not None:
+            orderer.new_move(game.state.cur_hist)
+        inf = float("inf")
+        best_move, score = pvs_root(
+            game.state, 1, -inf, inf, evaluate_func, chains, orderer
+        )
+        for d in range(2, depth + 1):
+            alpha, beta = score - window, score + window
+            while True:
+                move, new_score = pvs_root(
+                    game.state,
+                    d,
+                    alpha,
+                    beta,
+                    evaluate_func,
+                    chains,
+                    orderer,
+                    best_move,
+                )
+                if new_score <= alpha and alpha != -inf:
+                    alpha = -inf
+                elif new_score >= beta and beta != inf:
+                    beta = inf
+                else:
+                    break
+            best_move, score = move, new_score
+        game.state.stats.depth = depth
+
+        game.state.execute(board.decode(best_move))
+        return True
+
+    return execute_pvs_move_aux
+
+
+def pvs(
+    state: State,
+    depth: int,
+    alpha: float,
+    beta: float,
+    evaluate_func: Callable[[State], float],
+    chains: bool = False,
+    orderer: MoveOrderer | None = None,
+) -> float:
+    """
+    Principal variation search, scores are for the player about to move
+    A piece that keeps eating keeps the turn so, unlike negamax, the score
+    is only negated when the turn changes
+    """
+    board = state.board
+    stats = state.stats
+    stats.nodes += 1
+    if depth == 0 or board.is_terminal() != 0:
+        stats.leaves += 1
+        return evaluate_func(state) * (1 if board.next_player == 1 else -1)
+
+    moves = board.get_valid_codes(chains)
+    if orderer is not None:
+        moves = orderer.order(moves, depth)
+    _, score = _pvs_moves(
+        state, moves, depth, alpha, beta, evaluate_func, chains, orderer
+    )
+    return score
+
+
+def pvs_root(
+    state: State,
+    depth: int,
+    alpha: float,
+    beta: float,
+    evaluate_func: Callable[[State], float],
+    chains: bool = False,
+    orderer: MoveOrderer | None = None,
+    pv_move: int | None = None,
+) -> Tuple[int, float]:
+    """
+    Returns the best encoded action and its score, pv_move is searched first
+    A score outside (alpha, beta) is only a bound and must be searched again
+    """
+    moves = state.board.get_valid_codes(chains)
+    if orderer is not None:
+        orderer.new_search(depth)
+        moves = orderer.order(moves, depth, pv_move)
+    elif pv_move in moves:
+        moves.remove(pv_move)
+        moves.insert(0, pv_move)
+
+    best_move, score = _pvs_moves(
+        state, moves, depth, alpha, beta, evaluate_func, chains, orderer
+    )
+    return moves[0] if best_move is None else best_move, score
+
+
+def _pvs_moves(
+    state: State,
+    moves: List[int],
+    depth: int,
+    alpha: float,
+    beta: float,
+    evaluate_func: Callable[[State], float],
+    chains: bool,
+    orderer: MoveOrderer | None,
+) -> Tuple[int | None, float]:
+    """
+    Searches moves in order, the first one with the full window and the
+    rest with a null window that is widened only when they fail high
+    """
+    board = state.board
+    player = board.next_player
+    best_move, best = None, float("-inf")
+    for i, move in enumerate(moves):
+        board.make(move)
+        if i == 0:
+            score = _pvs_child(
+                state, depth - 1, alpha, beta, player, evaluate_func, chains, orderer
+            )
+        else:
+            score = _pvs_child(
+                state,
+                depth - 1,
+                alpha,
+                math.nextafter(alpha, math.inf),
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+            )
+            if alpha < score < beta:
+                score = _pvs_child(
+                    state,
+                    depth - 1,
+                    score,
+                    beta,
+                    player,
+                    evaluate_func,
+                    chains,
+                    orderer,
+                )
+        board.unmake(move)
+
+        if score > best:
+            best_move, best = move, score
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            state.stats.cutoff(i)
+            if orderer is not None:
+                orderer.cutoff(move, depth)
+            break
+
+    return best_move, best
+
+
+def _pvs_child(
+    state: State,
+    depth: int,
+    alpha: float,
+    beta: float,
+    player: int,
+    evaluate_func: Callable[[State], float],
+    chains: bool,
+    orderer: MoveOrderer | None,
+) -> float:
+    """
+    pvs score of the current position for player
+    """
+    if state.board.next_player == player:
+        return pvs(state, depth, alpha, beta, evaluate_func, chains, orderer)
+    return -pvs(state, depth, -beta, -alpha, evaluate_func, chains, orderer)
+
+
+def execute_negamax_copy_move(
+    evaluate_func: Callable[[Position], float],
+    depth: int,
+    chains: bool = False,
+    ordering: bool = False,
+) -> Callable[[Game], bool]:
+    orderer = MoveOrderer() if ordering else None
+
+    def execute_negamax_copy_move_aux(game: Game) -> bool:
+        """
+        updates the game state to the best possible move
+        (uses negamax over immutable positions to determine it)
+        """
+        best_moves = []
+        best_eval = float("-inf")
+        board = game.state.board
+        position = Position.from_board(board)
+        actions = valid_codes(position, chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
+            return True
+
+        player = position.next_player
+        if orderer is not None:
+            orderer.new_move(game.state.cur_hist)
+            orderer.new_search(depth)
+        for move in actions:
+            new_state_eval = negamax_copy(
+                apply(position, move),
+                depth - 1,
+                float("-inf"),
+                float("+inf"),
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+                game.state.stats,
+            )
+            if new_state_eval > best_eval:
+                best_moves = [move]
+                best_eval = new_state_eval
+            elif new_state_eval == best_eval:
+                best_moves.append(move)
+
+        game.state.stats.depth = depth
+        assert len(best_moves) != 0, f"Board has no valid actions {game.state.board}"
+        game.state.execute(board.decode(random.choice(best_moves)))
+        return True
+
+    return execute_negamax_copy_move_aux
+
+
+def negamax_copy(
+    position: Position,
+    depth: int,
+    alpha: float,
+    beta: float,
+    player: int,
+    evaluate_func: Callable[[Position], float],
+    chains: bool = False,
+    orderer: MoveOrderer | None = None,
+    stats: SearchStats | None = None,
+) -> float:
+    """
+    negamax using copy-make, positions are never modified
+    There is no State to keep stats in, they go to stats if given
+    """
+    if stats is not None:
+        stats.nodes += 1
+    if depth == 0 or is_terminal(position) != 0:
+        if stats is not None:
+            stats.leaves += 1
+        return evaluate_func(position) * (1 if player == 1 else -1)
+
+    moves = valid_codes(position, chains)
+    if orderer is not None:
+        moves = orderer.order(moves, depth)
+
+    score = float("-inf")
+    for i, move in enumerate(moves):
+        score = max(
+            score,
+            -negamax_copy(
+                apply(position, move),
+                depth - 1,
+                -beta,
+                -alpha,
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+                stats,
+            ),
+        )
+        alpha = max(alpha, score)
+        if alpha > beta:
+            if stats is not None:
+                stats.cutoff(i)
+            if orderer is not None:
+                orderer.cutoff(move, depth)
+            break
+
+    return score
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when its time is up
+    """
+
+
+def search_root(
+    search: Callable,
+    state: State,
+    depth: int,
+    evaluate_func: Callable,
+    chains: bool = False,
+    salt: int = 0,
+    orderer: MoveOrderer | None = None,
+) -> List[Tuple[int, float]]:
+    """
+    Scores every root move of state with one of the searches in this module
+    Returns (encoded action, score) pairs, higher is better for the next player
+    """
+    board = state.board
+    player = board.next_player
+    inf = float("inf")
+    if orderer is not None:
+        orderer.new_search(depth)
+
+    ret = []
+    if search is negamax_copy:
+        position = Position.from_board(board)
+        for move in valid_codes(position, chains):
+            score = negamax_copy(
+                apply(position, move),
+                depth - 1,
+                -inf,
+                inf,
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+                state.stats,
+            )
+            ret.append((move, score))
+        return ret
+
+    for move in board.get_valid_codes(chains):
+        board.make(move)
+        if search is negamax:
+            score = negamax(
+                state, depth - 1, -inf, inf, player, evaluate_func, chains, orderer
+            )
+        elif search is pvs:
+            score = _pvs_child(
+                state, depth - 1, -inf, inf, player, evaluate_func, chains, orderer
+            )
+        elif search is minimax_with_transposition:
+            score = minimax_with_transposition(
+                state,
+                depth - 1,
+                -inf,
+                inf,
+                False,
+                player,
+                evaluate_func,
+                chains,
+                salt,
+                orderer,
+            )
+        else:
+            score = search(
+                state,
+                depth - 1,
+                -inf,
+                inf,
+                False,
+                player,
+                evaluate_func,
+                chains,
+                orderer,
+            )
+        board.unmake(move)
+        ret.append((move, score))
+    return ret
+
+
+def best_root_moves(scores: List[Tuple[int, float]]) -> List[int]:
+    """
+    All the root moves tied for the best score
+    """
+    best_eval = max(score for _, score in scores)
+    return [move for move, score in scores if score == best_eval]
+
+
+def _with_deadline(evaluate_func: Callable, deadline: float) -> Callable:
+    """
+    Wraps an evaluation function so the search stops once deadline is reached
+    Evaluations happen at every leaf so the search never runs long past it
+    """
+
+    def evaluate(*args):
+        if time.perf_counter() > deadline:
+            raise SearchTimeout()
+        return evaluate_func(*args)
+
+    return evaluate
+
+
+def execute_iterative_deepening_move(
+    search: Callable,
+    evaluate_func: Callable,
+    time_budget: float,
+    max_depth: int = MAX_TURNS,
+    game_budget: float | None = None,
+    chains: bool = False,
+    ordering: bool = False,
+) -> Callable[[Game], bool]:
+    """
+    Searches deeper and deeper until time_budget seconds are used
+    search is any search in this module (minimax, negamax, ...) and
+    evaluate_func must be one it accepts
+    With a game_budget the time left is also spread over the remaining turns,
+    each player has its own game_budget when the engine plays both
+    The depth of the last completed iteration is stored in the search stats
+    With ordering the killers and history of one iteration order the next
+    """
+    # Time used in the game by player, index 0 is unused
+    game_time = {"state": None, "used": [0.0, 0.0, 0.0]}
+    orderer = MoveOrderer() if ordering else None
+
+    def execute_iterative_deepening_move_aux(game: Game) -> bool:
+        """
+        updates the game state to the best move of the deepest completed search
+        """
+        start_time = time.perf_counter()
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
+            return True
+
+        player = board.next_player
+        budget = time_budget
+        if game_budget is not None:
+            if game_time["state"] is not game.state:
+                game_time["state"], game_time["used"] = game.state, [0.0, 0.0, 0.0]
+            # The player makes every other action of the turns left
+            turns_left = max(1, (MAX_TURNS - game.state.cur_hist) // 2)
+            budget = min(budget, (game_budget - game_time["used"][player]) / turns_left)
+
+        salt = search_salt(evaluate_func, chains)
+        timed_eval = _with_deadline(evaluate_func, start_time + budget)
+        game.state.transposition_table.new_search()
+        if orderer is not None:
+            orderer.new_move(game.state.cur_hist)
+
+        # Depth 1 always completes so there is always a move
+        best_moves = best_root_moves(
+            search_root(search, game.state, 1, evaluate_func, chains, salt, orderer)
+        )
+        game.state.stats.depth = 1
+        for depth in range(2, max_depth + 1):
+            # Searches run on a copy, a timeout can leave it half way through a move
+            search_state = State(
+                board.copy(),
+                transposition_table=game.state.transposition_table,
+                stats=game.state.stats,
+            )
+            try:
+                scores = search_root(
+                    search, search_state, depth, timed_eval, chains, salt, orderer
+                )
+            except SearchTimeout:
+                break
+            best_moves = best_root_moves(scores)
+            game.state.stats.depth = depth
+
+        game_time["used"][player] += time.perf_counter() - start_time
+        game.state.execute(board.decode(random.choice(best_moves)))
+        return True
+
+    return execute_iterative_deepening_move_aux
+
+
 def execute_player_move(game: Game) -> bool:
     """
     Execute a human move and handle ui buttons
@@ -0,0 +1,110 @@
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
+from board import Weights, get_geometry
+from state import State
+from transposition import evaluator_name
+
+# Builds the weights of a board size
+WeightTable = Callable[[int, int], Weights]
+
+
+def player_weights(cell_weights: List[float]) -> Weights:
+    """
+    Weights where both players value the cells the same, player 2 pieces
+    count against player 1
+    """
+    return (
+        tuple(0.0 for _ in cell_weights),
+        tuple(cell_weights),
+        tuple(-w for w in cell_weights),
+    )
+
+
+@lru_cache(maxsize=None)
+def material(num_rows: int, num_cols: int) -> Weights:
+    """
+    Every piece is worth 1, same as eval_1
+    """
+    return player_weights([1.0] * (num_rows * num_cols))
+
+
+@lru_cache(maxsize=None)
+def border(num_rows: int, num_cols: int) -> Weights:
+    """
+    Pieces in the borders are worth 1, same as eval_2
+    """
+    return player_weights(
+        [
+            1.0 if x in (0, num_cols - 1) or y in (0, num_rows - 1) else 0.0
+            for x, y in get_geometry(num_rows, num_cols).coords
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def centre(num_rows: int, num_cols: int) -> Weights:
+    """
+    Pieces are worth the number of rings between them and the borders
+    """
+    return player_weights(
+        [
+            float(min(x, y, num_cols - 1 - x, num_rows - 1 - y))
+            for x, y in get_geometry(num_rows, num_cols).coords
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def mobility(num_rows: int, num_cols: int) -> Weights:
+    """
+    Pieces are worth the number of cells linked to theirs, a proxy of how
+    many actions they can have
+    """
+    return player_weights(
+        [float(len(links)) for links in get_geometry(num_rows, num_cols).links]
+    )
+
+
+class LinearEval:
+    """
+    Evaluation function that is a weighted sum of weight tables, from
+    player 1's point of view
+    The board keeps the score up to date as actions are executed and undone
+    (see Board.set_weights), evaluating is reading it
+    The first evaluation of a board sets its weights, boards only keep score
+    for one set of weights at a time
+    """
+
+    def __init__(self, *terms: Tuple[float, WeightTable]) -> None:
+        self.terms = terms
+        self.weights: Dict[Tuple[int, int], Weights] = {}
+        self.last: Weights | None = None
+
+    def __repr__(self) -> str:
+        terms = ", ".join(f"{c} * {evaluator_name(table)}" for c, table in self.terms)
+        return f"LinearEval({terms})"
+
+    def get_weights(self, num_rows: int, num_cols: int) -> Weights:
+        """
+        Sum of the terms for a board size
+        """
+        weights = self.weights.get((num_rows, num_cols))
+        if weights is None:
+            tables = [(c, table(num_rows, num_cols)) for c, table in self.terms]
+            weights = tuple(
+                tuple(
+                    sum(c * t[v][i] for c, t in tables)
+                    for i in range(num_rows * num_cols)
+                )
+                for v in range(3)
+            )
+            self.weights[num_rows, num_cols] = weights
+        return weights
+
+    def __call__(self, state: State) -> float:
+        board = state.board
+        if board.weights is None or board.weights is not self.last:
+            self.last = self.get_weights(board.num_rows, board.num_cols)
+            if board.weights is not self.last:
+                board.set_weights(self.last)
+        return board.score
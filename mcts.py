@@ -0,0 +1,212 @@
+from dataclasses import dataclass, field
+import math
+import random
+import time
+from typing import Callable, List
+from board import Board, eaten_count
+from constants import MAX_TURNS
+from game import Game, play_known_move
+from playouts import random_playouts
+
+# Plays a game to the end from board and returns its result (1, 2 or 3)
+# Arguments are board, chains, turns left before a draw and the rng
+RolloutPolicy = Callable[[Board, bool, int, random.Random], int]
+
+
+def random_rollout(board: Board, chains: bool, turns: int, rng: random.Random) -> int:
+    """
+    Every action is picked at random
+    """
+    for _ in range(turns + 1):
+        result = board.is_terminal()
+        if result != 0:
+            return result
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 0:
+            return 3
+        board.make(rng.choice(actions))
+    return board.is_terminal() or 3
+
+
+def capture_greedy_rollout(
+    board: Board, chains: bool, turns: int, rng: random.Random
+) -> int:
+    """
+    Picks the eat that eats the most pieces, or a move that doesn't leave
+    the opponent an eat when there is one
+    """
+    for _ in range(turns + 1):
+        result = board.is_terminal()
+        if result != 0:
+            return result
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 0:
+            return 3
+
+        if actions[0] >> 16:
+            most = max(eaten_count(action) for action in actions)
+            actions = [action for action in actions if eaten_count(action) == most]
+        else:
+            safe = []
+            for action in actions:
+                board.make(action)
+                if not board.has_any_capture():
+                    safe.append(action)
+                board.unmake(action)
+            actions = safe or actions
+        board.make(rng.choice(actions))
+    return board.is_terminal() or 3
+
+
+@dataclass(eq=False)
+class Node:
+    """
+    Node of the search tree
+    wins are counted for player, the one that played move, draws count half
+    """
+
+    move: int | None
+    player: int
+    key: int
+    untried: List[int]
+    parent: "Node | None" = None
+    children: List["Node"] = field(default_factory=list)
+    visits: int = 0
+    wins: float = 0
+
+    def uct_child(self, exploration: float) -> "Node":
+        log_visits = math.log(self.visits)
+        return max(
+            self.children,
+            key=lambda child: child.wins / child.visits
+            + exploration * math.sqrt(log_visits / child.visits),
+        )
+
+    def find(self, key: int, depth: int) -> "Node | None":
+        """
+        Descendant depth actions below this node with board key key
+        """
+        if depth == 0:
+            return self if self.key == key else None
+        for child in self.children:
+            node = child.find(key, depth - 1)
+            if node is not None:
+                return node
+        return None
+
+
+def execute_mcts_move(
+    iterations: int | None = None,
+    time_budget: float | None = None,
+    rollout: RolloutPolicy = random_rollout,
+    batch_size: int = 0,
+    exploration: float = math.sqrt(2),
+    chains: bool = False,
+    seed: int | None = None,
+) -> Callable[[Game], bool]:
+    """
+    Monte Carlo tree search (UCT), runs for a number of iterations or for
+    time_budget seconds
+    The tree is kept between moves, the part under the current position is
+    reused
+    With a batch_size every leaf gets batch_size random playouts run
+    together with numpy instead of one rollout
+    Search stats count the tree nodes visited as nodes, the playouts as
+    leaves and the deepest path as depth
+    """
+    assert iterations is not None or time_budget is not None, "Nothing limits mcts"
+    rng = random.Random(seed)
+    tree = {"root": None, "turn": 0}
+
+    def execute_mcts_move_aux(game: Game) -> bool:
+        """
+        updates the game state to the most visited move of the tree
+        """
+        start_time = time.perf_counter()
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
+            return True
+
+        root = None
+        old_root, old_turn = tree["root"], tree["turn"]
+        if old_root is not None and game.state.cur_hist >= old_turn:
+            root = old_root.find(board.key, game.state.cur_hist - old_turn)
+        if root is None:
+            root = Node(None, 3 - board.next_player, board.key, actions)
+        root.parent = None
+
+        search_board = board.copy()
+        stats = game.state.stats
+        done = 0
+        # At least one iteration so there is a move
+        while done == 0 or (
+            (iterations is None or done < iterations)
+            and (time_budget is None or time.perf_counter() - start_time < time_budget)
+        ):
+            done += 1
+            node = root
+            path = []
+
+            # Selection
+            while not node.untried and node.children:
+                node = node.uct_child(exploration)
+                search_board.make(node.move)
+                path.append(node.move)
+
+            # Expansion
+            turns = MAX_TURNS - game.state.cur_hist - len(path)
+            if node.untried and turns >= 0 and search_board.is_terminal() == 0:
+                move = node.untried.pop(rng.randrange(len(node.untried)))
+                player = search_board.next_player
+                search_board.make(move)
+                path.append(move)
+                turns -= 1
+                untried = []
+                if turns >= 0 and search_board.is_terminal() == 0:
+                    untried = search_board.get_valid_codes(chains)
+                child = Node(move, player, search_board.key, untried, node)
+                node.children.append(child)
+                node = child
+
+            stats.nodes += len(path) + 1
+            stats.depth = max(stats.depth, len(path))
+
+            # Simulation
+            result = search_board.is_terminal()
+            results = [0, 0, 0]
+            if result == 0 and turns >= 0 and batch_size > 0:
+                stats.leaves += batch_size
+                results = random_playouts(
+                    batch_size,
+                    board=search_board,
+                    max_turns=turns,
+                    seed=rng.getrandbits(32),
+                ).distribution()
+            elif result == 0 and turns >= 0:
+                stats.leaves += 1
+                results[rollout(search_board.copy(), chains, turns, rng) - 1] = 1
+            else:
+                # Game over, or a draw for running out of turns
+                results[(result or 3) - 1] = max(1, batch_size)
+
+            # Backpropagation
+            while node is not None:
+                node.visits += sum(results)
+                node.wins += results[node.player - 1] + results[2] / 2
+                node = node.parent
+
+            for move in reversed(path):
+                search_board.unmake(move)
+
+        best = max(root.children, key=lambda child: child.visits)
+        tree["root"], tree["turn"] = best, game.state.cur_hist + 1
+        game.state.execute(board.decode(best.move))
+        return True
+
+    return execute_mcts_move_aux
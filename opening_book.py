@@ -0,0 +1,80 @@
+from bisect import bisect_left, bisect_right
+import mmap
+import struct
+from typing import Dict, List
+from board import Board, transform_code
+
+# magic, num_rows, num_cols, chains, symmetric
+HEADER = struct.Struct("<8sBBBB4x")
+MAGIC = b"ALQBOOK3"
+
+
+class OpeningBook:
+    """
+    Opening book made by book_builder.py, the file is memory mapped
+    Holds (key, encoded action) pairs sorted by key, a position with several
+    best actions has a pair for each
+    In symmetric books symmetric positions share their entries, keys and
+    actions are those of the canonical image (see Board.canonical_key)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_rows, self.num_cols, chains, symmetric = HEADER.unpack_from(
+            self.mmap
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+        self.chains = bool(chains)
+        self.symmetric = bool(symmetric)
+        words = memoryview(self.mmap)[HEADER.size :].cast("Q")
+        self.keys = words[0::2]
+        self.moves = words[1::2]
+
+    def __reduce__(self):
+        return (OpeningBook, (self.path,))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, board: Board) -> List[int]:
+        """
+        Book actions of board, empty when it isn't in the book
+        """
+        if (board.num_rows, board.num_cols) != (self.num_rows, self.num_cols):
+            return []
+        symmetry = None
+        if self.symmetric:
+            key, symmetry = board.canonical_key()
+        else:
+            key = board.key
+        start = bisect_left(self.keys, key)
+        end = bisect_right(self.keys, key, start)
+        if start == end:
+            return []
+        # Keys are hashes, the actions must also be valid here
+        valid = board.get_valid_codes(self.chains)
+        moves = self.moves[start:end]
+        if symmetry is not None:
+            moves = (transform_code(move, symmetry.inverse) for move in moves)
+        return [move for move in moves if move in valid]
+
+
+def write_book(
+    path: str,
+    num_rows: int,
+    num_cols: int,
+    chains: bool,
+    book: Dict[int, List[int]],
+    symmetric: bool = False,
+) -> None:
+    """
+    Writes the book actions of every key to path
+    """
+    pairs = sorted((key, move) for key, moves in book.items() for move in moves)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, num_rows, num_cols, chains, symmetric))
+        for key, move in pairs:
+            f.write(struct.pack("<QQ", key, move))
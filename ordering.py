@@ -0,0 +1,86 @@
+from typing import Dict, List
+from board import eaten_count
+
+
+class MoveOrderer:
+    """
+    Orders encoded actions so alpha-beta cuts off sooner
+    Transposition table move first, then eats (the ones that eat the most
+    pieces first), then the killer moves of the ply, then the rest of the
+    moves by their history score
+    """
+
+    def __init__(self, num_killers: int = 2) -> None:
+        self.num_killers = num_killers
+        # Quiet moves that caused a cutoff, per ply
+        self.killers: List[List[int]] = []
+        # Cutoff score of every (from, to) pair, the low 16 bits of a move
+        self.history: Dict[int, int] = {}
+        self.root_depth = 0
+        # Actions played in the game before the root of the current move
+        self.root_ply: int | None = None
+
+    def new_move(self, ply: int) -> None:
+        """
+        Must be called once per game move, ply is the number of actions
+        played in the game so far
+        Killers move up by the actions played since the last move, so the
+        ones of the plies still ahead are kept, and history scores decay
+        """
+        if self.root_ply is None or ply < self.root_ply:
+            # New game or undone actions
+            self.killers = []
+        else:
+            del self.killers[: ply - self.root_ply]
+        self.root_ply = ply
+        self.history = {move: score // 2 for move, score in self.history.items()}
+
+    def new_search(self, root_depth: int) -> None:
+        """
+        Must be called before every root search, depth is the root depth
+        Killers and history carry over, every iteration of a deepening
+        search and every re-search is ordered with what the others found
+        """
+        self.root_depth = root_depth
+
+    def order(
+        self, moves: List[int], depth: int, tt_move: int | None = None
+    ) -> List[int]:
+        """
+        Returns moves from most to least promising
+        """
+        ply = self.root_depth - depth
+        killers = self.killers[ply] if 0 <= ply < len(self.killers) else []
+        history = self.history
+
+        def score(move: int) -> int:
+            if move == tt_move:
+                return 1 << 62
+            if move >> 16:
+                return (1 << 61) + eaten_count(move)
+            if move in killers:
+                return (1 << 60) - killers.index(move)
+            return history.get(move & 0xFFFF, 0)
+
+        return sorted(moves, key=score, reverse=True)
+
+    def cutoff(self, move: int, depth: int) -> None:
+        """
+        Records a move that caused a beta cutoff with depth left to search
+        """
+        if move >> 16:
+            # Eats are already tried first
+            return
+
+        ply = self.root_depth - depth
+        if ply < 0:
+            return
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[self.num_killers :]
+
+        self.history[move & 0xFFFF] = self.history.get(move & 0xFFFF, 0) + depth * depth
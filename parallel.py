@@ -0,0 +1,328 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import math
+from multiprocessing import resource_tracker
+import os
+import random
+from typing import Callable, Dict, List, Tuple, Type
+from board import Board, eaten_count
+from game import (
+    Game,
+    SearchTimeout,
+    _pvs_child,
+    best_root_moves,
+    minimax,
+    minimax_with_transposition,
+    negamax,
+    play_known_move,
+    pvs,
+    search_root,
+)
+from ordering import MoveOrderer
+from position import Position
+from search_stats import SearchStats
+from state import State
+from transposition import SharedTranspositionTable, search_salt
+
+_executor: ProcessPoolExecutor | None = None
+_num_workers = 0
+
+
+def get_executor(max_workers: int | None = None) -> ProcessPoolExecutor:
+    """
+    Process pool shared by every parallel search
+    Started on first use and kept for the rest of the program, max_workers
+    only counts the first time
+    """
+    global _executor, _num_workers
+    if _executor is None:
+        _num_workers = max_workers or os.cpu_count() or 1
+        # Workers must share the resource tracker of this process, their own
+        # would unlink shared tables when they exit (see SharedTranspositionTable)
+        resource_tracker.ensure_running()
+        _executor = ProcessPoolExecutor(_num_workers)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def score_root_move(
+    position: Position,
+    move: int,
+    search: Callable,
+    depth: int,
+    alpha: float,
+    evaluate_func: Callable,
+    chains: bool,
+    board_type: Type[Board],
+) -> Tuple[float, SearchStats]:
+    """
+    Runs in the workers, score of the root move for the player to move and
+    the stats of its search
+    Scores at or below alpha are only upper bounds
+    """
+    board = position.to_board(board_type)
+    state = State(board)
+    player = board.next_player
+    inf = float("inf")
+
+    board.make(move)
+    if search is minimax:
+        score = minimax(
+            state, depth - 1, alpha, inf, False, player, evaluate_func, chains
+        )
+    elif search is pvs:
+        score = _pvs_child(
+            state, depth - 1, alpha, inf, player, evaluate_func, chains, None
+        )
+    else:
+        # negamax scores aren't relative to the node, it only gets the full window
+        score = negamax(state, depth - 1, -inf, inf, player, evaluate_func, chains)
+    return score, state.stats
+
+
+def parallel_search_root(
+    search: Callable,
+    board: Board,
+    depth: int,
+    evaluate_func: Callable,
+    chains: bool = False,
+    max_workers: int | None = None,
+    stats: SearchStats | None = None,
+) -> List[Tuple[int, float]]:
+    """
+    Scores every root move in the process pool, same result as search_root
+    for the best moves
+    The move that eats the most is searched first in this process, its score
+    is the alpha of the others
+    The rest are handed out as workers free up, each one searched with the
+    best score found so far as alpha, so worse moves only get a bound
+    search is minimax, negamax or pvs, evaluate_func must be picklable
+    The stats of the workers are added to stats
+    """
+    executor = get_executor(max_workers)
+    position = Position.from_board(board)
+    pending = board.get_valid_codes(chains)
+    pending.reverse()
+    pending.sort(key=eaten_count)
+
+    # Without it every worker would start with the full window
+    move = pending.pop()
+    best, move_stats = score_root_move(
+        position,
+        move,
+        search,
+        depth,
+        float("-inf"),
+        evaluate_func,
+        chains,
+        type(board),
+    )
+    if stats is not None:
+        stats.add(move_stats)
+    ret = [(move, best)]
+    running: Dict[Future, int] = {}
+    while pending or running:
+        while pending and len(running) < _num_workers:
+            move = pending.pop()
+            # Just below best so moves tied with it still get their real score
+            alpha = math.nextafter(best, -math.inf)
+            future = executor.submit(
+                score_root_move,
+                position,
+                move,
+                search,
+                depth,
+                alpha,
+                evaluate_func,
+                chains,
+                type(board),
+            )
+            running[future] = move
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            score, move_stats = future.result()
+            if stats is not None:
+                stats.add(move_stats)
+            ret.append((running.pop(future), score))
+            best = max(best, score)
+
+    return ret
+
+
+def execute_parallel_move(
+    search: Callable,
+    evaluate_func: Callable,
+    depth: int,
+    chains: bool = False,
+    max_workers: int | None = None,
+) -> Callable[[Game], bool]:
+    """
+    execute_minimax_move / execute_negamax_move with the root moves searched
+    at the same time in a process pool
+    """
+
+    def execute_parallel_move_aux(game: Game) -> bool:
+        """
+        updates the game state to the best possible move
+        (uses a parallel root search to determine it)
+        """
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
+            return True
+
+        scores = parallel_search_root(
+            search, board, depth, evaluate_func, chains, max_workers, game.state.stats
+        )
+        game.state.stats.depth = depth
+        game.state.execute(board.decode(random.choice(best_root_moves(scores))))
+        return True
+
+    return execute_parallel_move_aux
+
+
+def lazy_smp_helper(
+    table: SharedTranspositionTable,
+    position: Position,
+    evaluate_func: Callable,
+    max_depth: int,
+    chains: bool,
+    salt: int,
+    board_type: Type[Board],
+    helper: int,
+    age: int,
+) -> Tuple[int, SearchStats]:
+    """
+    Runs in the workers, searches deeper and deeper filling the shared table
+    until a new search starts in it
+    Every other helper starts one ply deeper and every other pair orders
+    moves, so they don't all search the same tree in the same order
+    salt must be the one of the main search, the helpers get a copy of
+    evaluate_func that may not hash the same
+    Returns the last completed depth and the stats of the searches
+    """
+    state = State(position.to_board(board_type), transposition_table=table)
+    orderer = MoveOrderer() if helper // 2 % 2 else None
+
+    def evaluate(*args):
+        if table.age != age:
+            raise SearchTimeout()
+        return evaluate_func(*args)
+
+    completed = 0
+    try:
+        for depth in range(1 + helper % 2, max_depth):
+            search_root(
+                minimax_with_transposition,
+                state,
+                depth,
+                evaluate,
+                chains,
+                salt,
+                orderer,
+            )
+            completed = depth
+    except SearchTimeout:
+        pass
+    return completed, state.stats
+
+
+def execute_lazy_smp_move(
+    evaluate_func: Callable,
+    max_depth: int,
+    chains: bool = False,
+    num_helpers: int | None = None,
+    tt_size_mb: float = 16,
+    symmetric: bool = False,
+) -> Callable[[Game], bool]:
+    """
+    Lazy SMP, helpers in the process pool search the same root as this process
+    The game state uses a transposition table in shared memory so entries
+    stored by any of them help the others
+    symmetric is passed to the table, see TranspositionTable
+    Only the search of this process decides the move, the helpers are
+    stopped once it is done
+    Depths 1 to max_depth - 1 are searched, same as
+    execute_minimax_move_with_transposition
+    By default there is a helper for every worker but one, this process
+    searches too
+    """
+    tables: Dict[str, SharedTranspositionTable] = {}
+
+    def execute_lazy_smp_move_aux(game: Game) -> bool:
+        """
+        updates the game state to the best possible move
+        (uses minimax with a transposition table shared between processes)
+        """
+        board = game.state.board
+        actions = board.get_valid_codes(chains)
+        if len(actions) == 1:
+            # There isn't much to do and this can take a longggggg time
+            game.state.execute(board.decode(actions[0]))
+            return True
+
+        if play_known_move(game, chains):
+            return True
+
+        if "table" not in tables:
+            tables["table"] = SharedTranspositionTable(tt_size_mb, symmetric=symmetric)
+        table = tables["table"]
+        game.state.transposition_table = table
+        table.new_search()
+
+        executor = get_executor()
+        position = Position.from_board(board)
+        salt = search_salt(evaluate_func, chains)
+        helpers = [
+            executor.submit(
+                lazy_smp_helper,
+                table,
+                position,
+                evaluate_func,
+                max_depth,
+                chains,
+                salt,
+                type(board),
+                helper,
+                table.age,
+            )
+            for helper in range(
+                _num_workers - 1 if num_helpers is None else num_helpers
+            )
+        ]
+
+        best_moves = []
+        for depth in range(1, max_depth):
+            best_moves = best_root_moves(
+                search_root(
+                    minimax_with_transposition,
+                    game.state,
+                    depth,
+                    evaluate_func,
+                    chains,
+                    salt,
+                )
+            )
+        game.state.stats.depth = max_depth - 1
+
+        # Stops the helpers
+        table.new_search()
+        wait(helpers)
+        for helper in helpers:
+            game.state.stats.add(helper.result()[1])
+
+        game.state.execute(board.decode(random.choice(best_moves)))
+        return True
+
+    return execute_lazy_smp_move_aux
@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+import numpy as np
+from board import Board, get_geometry, initial_board
+from constants import MAX_TURNS
+
+
+@dataclass
+class PlayoutResult:
+    """
+    Outcome of a batch of random games
+    """
+
+    # 1 - Player_1 wins, 2 - Player_2 wins, 3 - Draw
+    results: np.ndarray
+    # Number of actions played in every game
+    lengths: np.ndarray
+
+    def distribution(self) -> List[int]:
+        """
+        [player 1 victories, player 2 victories, draws]
+        """
+        return [int((self.results == r).sum()) for r in (1, 2, 3)]
+
+
+@lru_cache(maxsize=None)
+def playout_tables(num_rows: int, num_cols: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the (source, dest) of every step and the (source, over, landing)
+    of every jump on the board
+    """
+    steps = []
+    jumps = []
+    for i, links in enumerate(get_geometry(num_rows, num_cols).links):
+        for n, land in links:
+            steps.append((i, n))
+            if land >= 0:
+                jumps.append((i, n, land))
+    return np.array(steps).T, np.array(jumps).T
+
+
+def _captures(grids: np.ndarray, players: np.ndarray, jumps: np.ndarray) -> np.ndarray:
+    """
+    N x jumps mask of the eats available to players
+    """
+    src, over, land = jumps
+    return (
+        (grids[:, src] == players[:, None])
+        & (grids[:, over] == 3 - players[:, None])
+        & (grids[:, land] == 0)
+    )
+
+
+def _pick(legal: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Uniformly picks one legal column for every row
+    """
+    return np.where(legal, rng.random(legal.shape), -1).argmax(axis=1)
+
+
+def random_playouts(
+    num_games: int,
+    num_rows: int = 5,
+    num_cols: int = 5,
+    board: Board | None = None,
+    max_turns: int = MAX_TURNS,
+    seed: int | None = None,
+) -> PlayoutResult:
+    """
+    Plays num_games random games in lockstep
+    Same rules as execute_random_move in a Game, eats are mandatory and
+    a piece that can keep eating keeps the turn
+    Games start from board if given, otherwise from the initial board
+    A player that can't move ends the game in a draw
+    """
+    rng = np.random.default_rng(seed)
+    if board is not None:
+        num_rows, num_cols = board.num_rows, board.num_cols
+        start, player = board.grid, board.next_player
+    else:
+        start, player = initial_board(num_rows, num_cols), 1
+
+    (step_src, step_dst), jumps = playout_tables(num_rows, num_cols)
+    jump_src, jump_over, jump_land = jumps
+
+    grids = np.tile(np.array(start, dtype=np.int8), (num_games, 1))
+    players = np.full(num_games, player, dtype=np.int8)
+    results = np.zeros(num_games, dtype=np.int8)
+    lengths = np.zeros(num_games, dtype=np.int32)
+
+    active = np.arange(num_games)
+    while len(active) > 0:
+        g = grids[active]
+        p = players[active]
+
+        eats = _captures(g, p, jumps)
+        can_eat = eats.any(axis=1)
+        steps = (g[:, step_src] == p[:, None]) & (g[:, step_dst] == 0)
+        steps[can_eat] = False
+
+        # Stuck players
+        stuck = ~can_eat & ~steps.any(axis=1)
+        results[active[stuck]] = 3
+
+        # Eats
+        rows = np.flatnonzero(can_eat)
+        j = _pick(eats[rows], rng)
+        src, over, land = jump_src[j], jump_over[j], jump_land[j]
+        g[rows, src] = 0
+        g[rows, over] = 0
+        g[rows, land] = p[rows]
+
+        # The turn stays with the player if the piece that ate can eat again
+        streak = (_captures(g[rows], p[rows], jumps) & (jump_src == land[:, None])).any(
+            axis=1
+        )
+        p[rows[~streak]] = 3 - p[rows[~streak]]
+
+        # Moves
+        rows = np.flatnonzero(~can_eat & ~stuck)
+        j = _pick(steps[rows], rng)
+        g[rows, step_src[j]] = 0
+        g[rows, step_dst[j]] = p[rows]
+        p[rows] = 3 - p[rows]
+
+        grids[active] = g
+        players[active] = p
+        moved = active[~stuck]
+        lengths[moved] += 1
+
+        # Game results, same order as Game.start
+        g, p = grids[moved], players[moved]
+        count1 = (g == 1).sum(axis=1)
+        count2 = (g == 2).sum(axis=1)
+        result = np.zeros(len(moved), dtype=np.int8)
+        draw = (count1 == 1) & (count2 == 1) & ~_captures(g, p, jumps).any(axis=1)
+        result[draw] = 3
+        result[count2 == 0] = 1
+        result[count1 == 0] = 2
+        result[(result == 0) & (lengths[moved] > max_turns)] = 3
+        results[moved] = result
+
+        active = active[results[active] == 0]
+
+    return PlayoutResult(results, lengths)
@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from typing import List, Literal, Tuple, Type
+from board import Board
+from bitboard import (
+    any_capture,
+    can_eat_from,
+    capture_codes,
+    chain_codes,
+    direction_masks,
+    move_codes,
+    square_jumps,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Position:
+    """
+    Immutable board position, each player is a bitmask
+    Safe to share between threads, cache or send to other processes
+    Uses the same encoded actions as Board
+    """
+
+    num_rows: int
+    num_cols: int
+    bits1: int
+    bits2: int
+    next_player: int
+
+    @staticmethod
+    def from_board(board: Board) -> "Position":
+        bits = [0, 0, 0]
+        for i, v in enumerate(board.grid):
+            if v != 0:
+                bits[v] |= 1 << i
+        return Position(
+            board.num_rows, board.num_cols, bits[1], bits[2], board.next_player
+        )
+
+    def to_board(self, board_type: Type[Board] = Board) -> Board:
+        return board_type(self.num_rows, self.num_cols, self.next_player, self.grid())
+
+    def grid(self) -> List[int]:
+        """
+        Returns the position as a Board grid
+        """
+        return [
+            1 if self.bits1 >> i & 1 else 2 if self.bits2 >> i & 1 else 0
+            for i in range(self.num_rows * self.num_cols)
+        ]
+
+    def _own_opp_empty(self) -> Tuple[int, int, int]:
+        if self.next_player == 1:
+            own, opp = self.bits1, self.bits2
+        else:
+            own, opp = self.bits2, self.bits1
+        full = (1 << (self.num_rows * self.num_cols)) - 1
+        return own, opp, full ^ (own | opp)
+
+
+def valid_codes(position: Position, chains: bool = False) -> List[int]:
+    """
+    Get all encoded actions for the next player
+    Same rules as Board.get_valid_codes
+    """
+    own, opp, empty = position._own_opp_empty()
+    if chains:
+        ret = chain_codes(
+            own, opp, empty, square_jumps(position.num_rows, position.num_cols)
+        )
+    else:
+        ret = capture_codes(
+            own, opp, empty, direction_masks(position.num_rows, position.num_cols)
+        )
+    if ret:
+        return ret
+    return move_codes(own, empty, direction_masks(position.num_rows, position.num_cols))
+
+
+def apply(position: Position, code: int) -> Position:
+    """
+    Returns the position after the encoded action
+    The turn only stays with the player if the piece that ate can eat again
+    """
+    own, opp, empty = position._own_opp_empty()
+    source = code & 0xFF
+    dest = code >> 8 & 0xFF
+
+    own ^= 1 << source ^ 1 << dest
+    empty ^= 1 << source ^ 1 << dest
+    eaten = code >> 16
+    while eaten:
+        opp ^= 1 << ((eaten & 0xFF) - 1)
+        empty |= 1 << ((eaten & 0xFF) - 1)
+        eaten >>= 8
+
+    next_player = 3 - position.next_player
+    if code >> 16 and can_eat_from(
+        dest, opp, empty, square_jumps(position.num_rows, position.num_cols)
+    ):
+        next_player = position.next_player
+
+    if position.next_player == 1:
+        bits1, bits2 = own, opp
+    else:
+        bits1, bits2 = opp, own
+    return Position(position.num_rows, position.num_cols, bits1, bits2, next_player)
+
+
+def is_terminal(position: Position) -> Literal[0, 1, 2, 3]:
+    """
+    Get game result, same values as Board.is_terminal
+    """
+    count1 = position.bits1.bit_count()
+    count2 = position.bits2.bit_count()
+
+    if count1 == 0:
+        return 2
+    elif count2 == 0:
+        return 1
+    elif count1 == count2 == 1:
+        own, opp, empty = position._own_opp_empty()
+        masks = direction_masks(position.num_rows, position.num_cols)
+        if not any_capture(own, opp, empty, masks):
+            return 3
+
+    return 0
@@ -0,0 +1,123 @@
+from functools import partial
+from typing import Callable, Iterable
+from bitboard import (
+    any_capture,
+    chain_codes,
+    direction_masks,
+    iter_capture_codes,
+    square_jumps,
+)
+from position import Position, apply, is_terminal
+from state import State
+
+
+def quiescence(
+    state: State,
+    alpha: float,
+    beta: float,
+    evaluate_func: Callable[[State], float],
+    chains: bool = False,
+) -> float:
+    """
+    Keeps searching eats until the player to move can't eat
+    Scores are for the player about to move
+    Eats are mandatory so the player can only stand pat, take the static
+    evaluation, once the position is quiet
+    """
+    board = state.board
+    if board.is_terminal() != 0 or not board.has_any_capture():
+        return evaluate_func(state) * (1 if board.next_player == 1 else -1)
+
+    player = board.next_player
+    best = float("-inf")
+    for move in board.get_chain_codes() if chains else board.iter_capture_codes():
+        board.make(move)
+        if board.next_player == player:
+            score = quiescence(state, alpha, beta, evaluate_func, chains)
+        else:
+            score = -quiescence(state, -beta, -alpha, evaluate_func, chains)
+        board.unmake(move)
+
+        best = max(best, score)
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            break
+
+    return best
+
+
+def position_quiescence(
+    position: Position,
+    alpha: float,
+    beta: float,
+    evaluate_func: Callable[[Position], float],
+    chains: bool = False,
+) -> float:
+    """
+    quiescence over immutable positions
+    """
+    own, opp, empty = position._own_opp_empty()
+    masks = direction_masks(position.num_rows, position.num_cols)
+    if is_terminal(position) != 0 or not any_capture(own, opp, empty, masks):
+        return evaluate_func(position) * (1 if position.next_player == 1 else -1)
+
+    if chains:
+        jumps = square_jumps(position.num_rows, position.num_cols)
+        eats: Iterable[int] = chain_codes(own, opp, empty, jumps)
+    else:
+        eats = iter_capture_codes(own, opp, empty, masks)
+
+    best = float("-inf")
+    for move in eats:
+        child = apply(position, move)
+        if child.next_player == position.next_player:
+            score = position_quiescence(child, alpha, beta, evaluate_func, chains)
+        else:
+            score = -position_quiescence(child, -beta, -alpha, evaluate_func, chains)
+
+        best = max(best, score)
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            break
+
+    return best
+
+
+def quiescence_eval(
+    evaluate_func: Callable[[State], float], chains: bool, state: State
+) -> float:
+    """
+    Static evaluation of the position at the end of the pending eats
+    Same point of view as evaluate_func, player 1's
+    """
+    sign = 1 if state.board.next_player == 1 else -1
+    inf = float("inf")
+    return quiescence(state, -inf, inf, evaluate_func, chains) * sign
+
+
+def position_quiescence_eval(
+    evaluate_func: Callable[[Position], float], chains: bool, position: Position
+) -> float:
+    sign = 1 if position.next_player == 1 else -1
+    inf = float("inf")
+    return position_quiescence(position, -inf, inf, evaluate_func, chains) * sign
+
+
+def quiescent(
+    evaluate_func: Callable[[State], float], chains: bool = False
+) -> Callable[[State], float]:
+    """
+    Evaluation function that runs a quiescence search before evaluating
+    Works with every engine that takes an evaluation function of a State
+    chains should match the one of the engine
+    """
+    return partial(quiescence_eval, evaluate_func, chains)
+
+
+def position_quiescent(
+    evaluate_func: Callable[[Position], float], chains: bool = False
+) -> Callable[[Position], float]:
+    """
+    quiescent for the engines that evaluate positions (negamax_copy)
+    """
+    return partial(position_quiescence_eval, evaluate_func, chains)
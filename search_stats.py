@@ -0,0 +1,80 @@
+from dataclasses import dataclass, field, fields
+from typing import List
+
+
+@dataclass
+class SearchStats:
+    """
+    What the searches did, kept in State.stats while they run
+    Game keeps the stats of every engine move and adds them up per game and
+    per match, depth and elapsed_ns are then totals over searches
+    """
+
+    nodes: int = 0
+    # Nodes scored by the evaluation function
+    leaves: int = 0
+    # Beta cutoffs by the index of the move that caused them
+    cutoffs: List[int] = field(default_factory=list)
+    tt_probes: int = 0
+    tt_hits: int = 0
+    tt_stores: int = 0
+    # Depth reached, the last completed one for iterative deepening
+    depth: int = 0
+    elapsed_ns: int = 0
+    # Engine moves added up, moves that didn't search aren't counted
+    searches: int = 0
+
+    def cutoff(self, index: int) -> None:
+        cutoffs = self.cutoffs
+        while len(cutoffs) <= index:
+            cutoffs.append(0)
+        cutoffs[index] += 1
+
+    def add(self, other: "SearchStats") -> None:
+        for f in fields(self):
+            if f.name != "cutoffs":
+                setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+        cutoffs = self.cutoffs
+        cutoffs.extend([0] * (len(other.cutoffs) - len(cutoffs)))
+        for index, count in enumerate(other.cutoffs):
+            cutoffs[index] += count
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes * 1e9 / self.elapsed_ns if self.elapsed_ns else 0.0
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        """
+        Share of the cutoffs caused by the first move, higher is better ordering
+        """
+        total = sum(self.cutoffs)
+        return self.cutoffs[0] / total if total else 0.0
+
+    @property
+    def branching_factor(self) -> float:
+        """
+        Effective branching factor, nodes ** (1 / depth) of the average search
+        """
+        searches = max(self.searches, 1)
+        if self.depth == 0 or self.nodes == 0:
+            return 0.0
+        return (self.nodes / searches) ** (searches / self.depth)
+
+    def __str__(self) -> str:
+        searches = max(self.searches, 1)
+        return (
+            f"{self.nodes} nodes ({self.nodes_per_second:.0f}/s), "
+            f"{self.leaves} leaves, "
+            f"depth {self.depth / searches:.1f}, "
+            f"EBF {self.branching_factor:.2f}, "
+            f"{sum(self.cutoffs)} cutoffs "
+            f"({self.first_move_cutoff_rate:.0%} first move), "
+            f"TT {self.tt_hits}/{self.tt_probes} hits ({self.tt_hit_rate:.0%}), "
+            f"{self.tt_stores} stores, "
+            f"{self.elapsed_ns / 1e9:.3f} s"
+        )
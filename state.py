@@ -1,6 +1,7 @@
-from typing import Dict, Tuple
 from board import Action, Board, List
 from dataclasses import dataclass, field
+from search_stats import SearchStats
+from transposition import PackedTranspositionTable, TranspositionTable
 
 
 @dataclass
@@ -13,9 +14,11 @@ class State:
     history: List[Action] = field(default_factory=list)
     cur_hist: int = 0
 
-    transposition_table: Dict[int, Tuple[List[Action], int]] = field(
-        default_factory=dict
+    transposition_table: TranspositionTable | PackedTranspositionTable = field(
+        default_factory=TranspositionTable
     )
+    # Filled in by the searches
+    stats: SearchStats = field(default_factory=SearchStats)
 
     def execute(self, action: Action):
         """
@@ -0,0 +1,391 @@
+from array import array
+import argparse
+from functools import partial
+from itertools import combinations
+from math import comb
+import mmap
+import struct
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from board import Board
+from position import Position, apply, is_terminal, valid_codes
+from state import State
+
+# Results, always for the player about to move
+WIN = 1
+LOSS = 2
+DRAW = 3
+
+# Entries are 2 bytes, result in bits 0-1 and actions to the end in 2-15
+MAX_DISTANCE = 0x3FFF
+
+# Scores of tablebase wins, more than any evaluation function gives
+WIN_SCORE = 1000.0
+
+# magic, num_rows, num_cols, max_pieces, chains
+HEADER = struct.Struct("<8sBBBB4x")
+MAGIC = b"ALQTBAS2"
+
+
+def piece_classes(max_pieces: int) -> List[Tuple[int, int]]:
+    """
+    (player 1 pieces, player 2 pieces) of every class with up to max_pieces
+    Classes with fewer pieces come first, captures only lead to earlier ones
+    """
+    return [
+        (count1, total - count1)
+        for total in range(2, max_pieces + 1)
+        for count1 in range(1, total)
+    ]
+
+
+def class_size(num_cells: int, count1: int, count2: int) -> int:
+    return comb(num_cells, count1) * comb(num_cells - count1, count2)
+
+
+def class_offsets(num_cells: int, max_pieces: int) -> Dict[Tuple[int, int], int]:
+    """
+    Index of the first entry of every class in the file
+    """
+    offsets = {}
+    offset = 0
+    for count1, count2 in piece_classes(max_pieces):
+        offsets[count1, count2] = offset
+        offset += class_size(num_cells, count1, count2)
+    return offsets
+
+
+def player_1_to_move(position: Position) -> Position:
+    """
+    Position with player 1 to move that has the same result
+    Swapping the players keeps the rules, so the table only holds positions
+    with player 1 to move and the rest are looked up with the pieces swapped
+    """
+    if position.next_player == 1:
+        return position
+    return Position(
+        position.num_rows, position.num_cols, position.bits2, position.bits1, 1
+    )
+
+
+def rank(position: Position) -> int:
+    """
+    Index of position in its class, player 1 must be the next player
+    Player 1 cells are ranked among all cells and player 2 cells among the
+    cells left, both with the combinatorial number system
+    """
+    bits1, bits2 = position.bits1, position.bits2
+    rank1 = 0
+    k = 0
+    b = bits1
+    while b:
+        low = b & -b
+        b ^= low
+        k += 1
+        rank1 += comb(low.bit_length() - 1, k)
+
+    rank2 = 0
+    count2 = 0
+    b = bits2
+    while b:
+        low = b & -b
+        b ^= low
+        count2 += 1
+        # Cell index skipping the cells of player 1
+        rank2 += comb(low.bit_length() - 1 - (bits1 & (low - 1)).bit_count(), count2)
+
+    num_cells = position.num_rows * position.num_cols
+    return rank1 * comb(num_cells - k, count2) + rank2
+
+
+class Tablebase:
+    """
+    Endgame tablebase made by generate, the file is memory mapped
+    Knows the result and the number of actions to the end of every
+    position with up to max_pieces pieces
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.num_rows, self.num_cols, self.max_pieces, chains = (
+            HEADER.unpack_from(self.mmap)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tablebase")
+        self.chains = bool(chains)
+        self.offsets = class_offsets(self.num_rows * self.num_cols, self.max_pieces)
+        # Little endian like the rest of the file
+        self.entries = memoryview(self.mmap)[HEADER.size :].cast("H")
+
+    def __reduce__(self):
+        return (Tablebase, (self.path,))
+
+    def probe(self, position: Position) -> Tuple[int, int] | None:
+        """
+        (result, actions to the end) of position or None if it isn't in the table
+        """
+        if (position.num_rows, position.num_cols) != (self.num_rows, self.num_cols):
+            return None
+        if position.bits1 == 0 or position.bits2 == 0:
+            return _game_over(position)
+        position = player_1_to_move(position)
+        count1, count2 = position.bits1.bit_count(), position.bits2.bit_count()
+        offset = self.offsets.get((count1, count2))
+        if offset is None:
+            return None
+
+        entry = self.entries[offset + rank(position)]
+        return entry & 0x3, entry >> 2
+
+    def probe_board(self, board: Board) -> Tuple[int, int] | None:
+        if board.counts[1] + board.counts[2] > self.max_pieces:
+            return None
+        return self.probe(Position.from_board(board))
+
+    def score(self, position: Position) -> float | None:
+        """
+        Score of position for player 1, faster wins and slower losses are better
+        """
+        probe = self.probe(position)
+        if probe is None:
+            return None
+        result, distance = probe
+        if result == DRAW:
+            return 0.0
+        score = WIN_SCORE - distance if result == WIN else distance - WIN_SCORE
+        return score if position.next_player == 1 else -score
+
+    def best_moves(self, position: Position) -> List[int] | None:
+        """
+        Encoded actions that win the fastest, draw, or lose the slowest
+        None if position isn't in the table
+        """
+        if self.probe(position) is None:
+            return None
+
+        best: List[int] = []
+        best_value = None
+        for move in valid_codes(position, self.chains):
+            child = apply(position, move)
+            value = _preference(_for_parent(position, child, self.probe(child)))
+            if best_value is None or value > best_value:
+                best, best_value = [move], value
+            elif value == best_value:
+                best.append(move)
+        return best
+
+
+def _game_over(position: Position) -> Tuple[int, int]:
+    """
+    (result, distance) of a position where a player has no pieces left
+    """
+    winner = 1 if position.bits2 == 0 else 2
+    return (WIN if position.next_player == winner else LOSS), 0
+
+
+def _for_parent(
+    position: Position, child: Position, value: Tuple[int, int] | None
+) -> Tuple[int, int]:
+    """
+    (result, distance) of child for the player to move in position
+    """
+    assert value is not None, "Captures can't leave the tablebase"
+    result, distance = value
+    if child.next_player != position.next_player and result != DRAW:
+        result = WIN if result == LOSS else LOSS
+    return result, distance
+
+
+def _solved_value(
+    position: Position, solved: Dict[Tuple[int, int], np.ndarray]
+) -> Tuple[int, int]:
+    if position.bits1 == 0 or position.bits2 == 0:
+        return _game_over(position)
+    position = player_1_to_move(position)
+    count1, count2 = position.bits1.bit_count(), position.bits2.bit_count()
+    entry = int(solved[count1, count2][rank(position)])
+    return entry & 0x3, entry >> 2
+
+
+def _entry(result: int, distance: int) -> int:
+    return result | min(distance, MAX_DISTANCE) << 2
+
+
+def _solve_classes(
+    num_rows: int,
+    num_cols: int,
+    count1: int,
+    count2: int,
+    solved: Dict[Tuple[int, int], np.ndarray],
+    chains: bool,
+) -> Dict[Tuple[int, int], np.ndarray]:
+    """
+    Entries of every position with count1 and count2 pieces, and of the ones
+    with count2 and count1 pieces
+    Moves hand the turn to player 2, so they lead from one class to the other
+    with the pieces swapped, both are solved together
+    Eats lead to solved classes, moves are solved backwards from the
+    positions already known
+    """
+    num_cells = num_rows * num_cols
+    classes = [(count1, count2)]
+    if count1 != count2:
+        classes.append((count2, count1))
+    offsets = {}
+    size = 0
+    for counts in classes:
+        offsets[counts] = size
+        size += class_size(num_cells, *counts)
+    entries = np.zeros(size, dtype=np.uint16)
+
+    # Known positions by distance
+    buckets: List[List[int]] = [[]]
+    # Moves of the positions that can only move, children are in these classes
+    unknown = np.zeros(len(entries), dtype=np.int32)
+    edges_from = array("i")
+    edges_to = array("i")
+
+    cells = range(num_cells)
+    for counts in classes:
+        offset = offsets[counts]
+        for cells1 in combinations(cells, counts[0]):
+            bits1 = sum(1 << i for i in cells1)
+            rest = [i for i in cells if not bits1 >> i & 1]
+            for cells2 in combinations(rest, counts[1]):
+                bits2 = sum(1 << i for i in cells2)
+                position = Position(num_rows, num_cols, bits1, bits2, 1)
+                index = offset + rank(position)
+                moves = valid_codes(position, chains)
+                if is_terminal(position) != 0 or len(moves) == 0:
+                    # Only draws end a game with pieces of both players
+                    entries[index] = _entry(DRAW, 0)
+                    continue
+
+                if moves[0] >> 16:
+                    # Eats are mandatory, every child is in a solved class
+                    result, distance = max(
+                        (
+                            _for_parent(position, child, _solved_value(child, solved))
+                            for child in (apply(position, move) for move in moves)
+                        ),
+                        key=_preference,
+                    )
+                    distance += 1
+                    entries[index] = _entry(result, distance)
+                    if result != DRAW:
+                        while len(buckets) <= distance:
+                            buckets.append([])
+                        buckets[distance].append(index)
+                    continue
+
+                unknown[index] = len(moves)
+                for move in moves:
+                    child = player_1_to_move(apply(position, move))
+                    edges_from.append(index)
+                    edges_to.append(offsets[counts[1], counts[0]] + rank(child))
+
+    # Parents of every position
+    edges_from_np = np.frombuffer(edges_from, dtype=np.int32)
+    edges_to_np = np.frombuffer(edges_to, dtype=np.int32)
+    order = np.argsort(edges_to_np, kind="stable")
+    parents = edges_from_np[order].tolist()
+    starts = np.searchsorted(edges_to_np[order], np.arange(len(entries) + 1)).tolist()
+    remaining = unknown.tolist()
+
+    # Moves always change the turn, a loss for the child is a win for the parent
+    distance = 0
+    while distance < len(buckets):
+        for index in buckets[distance]:
+            result = int(entries[index]) & 0x3
+            for parent in parents[starts[index] : starts[index + 1]]:
+                if remaining[parent] <= 0:
+                    continue
+                if result == LOSS:
+                    remaining[parent] = 0
+                    parent_result = WIN
+                else:
+                    remaining[parent] -= 1
+                    if remaining[parent] != 0:
+                        continue
+                    # Every move loses, distance is the longest since
+                    # distances are handled in order
+                    parent_result = LOSS
+                entries[parent] = _entry(parent_result, distance + 1)
+                if len(buckets) <= distance + 1:
+                    buckets.append([])
+                buckets[distance + 1].append(parent)
+        distance += 1
+
+    # Positions never decided go around in circles
+    undecided = np.flatnonzero(entries == 0)
+    entries[undecided] = _entry(DRAW, 0)
+    return {
+        counts: entries[offset : offset + class_size(num_cells, *counts)]
+        for counts, offset in offsets.items()
+    }
+
+
+def _preference(value: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Sort key of (result, distance), win fastest, draw, lose slowest
+    """
+    result, distance = value
+    if result == WIN:
+        return (2, -distance)
+    if result == DRAW:
+        return (1, 0)
+    return (0, distance)
+
+
+def generate(
+    num_rows: int, num_cols: int, max_pieces: int, path: str, chains: bool = False
+) -> None:
+    """
+    Retrograde analysis of every position with up to max_pieces pieces,
+    written to path
+    Only positions with player 1 to move are stored, swapping the players
+    gives the rest
+    chains must match the engines that use it
+    """
+    solved: Dict[Tuple[int, int], np.ndarray] = {}
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, num_rows, num_cols, max_pieces, chains))
+        for count1, count2 in piece_classes(max_pieces):
+            if (count1, count2) not in solved:
+                solved.update(
+                    _solve_classes(num_rows, num_cols, count1, count2, solved, chains)
+                )
+            f.write(solved[count1, count2].astype("<u2").tobytes())
+
+
+def tablebase_eval(
+    tablebase: Tablebase, evaluate_func: Callable[[State], float], state: State
+) -> float:
+    board = state.board
+    if board.counts[1] + board.counts[2] <= tablebase.max_pieces:
+        score = tablebase.score(Position.from_board(board))
+        if score is not None:
+            return score
+    return evaluate_func(state)
+
+
+def with_tablebase(
+    tablebase: Tablebase, evaluate_func: Callable[[State], float]
+) -> Callable[[State], float]:
+    """
+    Evaluation function that uses the tablebase score of the positions in it
+    """
+    return partial(tablebase_eval, tablebase, evaluate_func)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an endgame tablebase")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--cols", type=int, default=5)
+    parser.add_argument("--pieces", type=int, default=4)
+    parser.add_argument("--chains", action="store_true")
+    args = parser.parse_args()
+    generate(args.rows, args.cols, args.pieces, args.path, args.chains)
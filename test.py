@@ -8,6 +8,8 @@ from game import (
     execute_negamax_move,
 )
 from gui import Renderer
+from mcts import capture_greedy_rollout, execute_mcts_move
+from transposition import FileTranspositionTable
 from eval_fncs import eval_1, eval_2
 import itertools
 import sys
@@ -18,6 +20,9 @@ num_cols = 5
 s = State(Board(num_rows, num_cols))
 # g = Renderer(num_rows, num_cols)
 g = None
+# Keeps the transposition table between games and runs
+# tt = FileTranspositionTable("test.tt", num_rows, num_cols, [eval_1, eval_2])
+tt = None
 
 contenders = [
     (execute_random_move, "Random Player"),
@@ -33,11 +38,21 @@ contenders = [
     (execute_minimax_move_with_transposition(eval_1, 7), "Minimax_tt (eval_1, 7)"),
     (execute_minimax_move_with_transposition(eval_2, 5), "Minimax_tt (eval_2, 5)"),
     (execute_minimax_move_with_transposition(eval_2, 7), "Minimax_tt (eval_2, 7)"),
+    (execute_mcts_move(500), "MCTS (random, 500)"),
+    (
+        execute_mcts_move(500, rollout=capture_greedy_rollout),
+        "MCTS (capture greedy, 500)",
+    ),
 ]
 
 for p1_AI, p2_AI in list(itertools.combinations_with_replacement(contenders, 2)):
     game = Game(
-        s, p1_AI[0], p2_AI[0], player1_AI_name=p1_AI[1], player2_AI_name=p2_AI[1]
+        s,
+        p1_AI[0],
+        p2_AI[0],
+        player1_AI_name=p1_AI[1],
+        player2_AI_name=p2_AI[1],
+        persistent_table=tt,
     )
     game.run_n_matches(10, log_moves=False)
     sys.stdout.flush()
@@ -0,0 +1,353 @@
+from functools import partial
+import hashlib
+import mmap
+from multiprocessing.shared_memory import SharedMemory
+import os
+import struct
+from types import CodeType
+from typing import Callable, Dict, Iterable, List, NamedTuple
+import weakref
+
+# Bound types, scores are always stored from player 1's point of view
+EXACT = 0
+LOWER = 1
+UPPER = 2
+# Bound type seen from the other player, OPPOSITE[flag]
+OPPOSITE = (EXACT, UPPER, LOWER)
+
+# Rough size of one stored entry in bytes (tuple plus its ints)
+ENTRY_SIZE = 200
+
+# Xored into the key of nodes where player 2 is the one choosing
+# Keeps the streak plies (same player, other node type) apart
+CHOOSER_KEY = 0x9E3779B97F4A7C15
+
+
+class TTEntry(NamedTuple):
+    key: int
+    score: float
+    flag: int
+    depth: int
+    move: int | None
+    age: int
+
+
+class TranspositionTable:
+    """
+    Fixed size transposition table
+    Every bucket has a depth-preferred slot and an always-replace slot
+    With symmetric, searches store positions under their canonical key so
+    symmetric positions share entries (see Board.canonical_key), only for
+    evaluation functions that score the images of a position the same
+    """
+
+    def __init__(self, size_mb: float = 16, symmetric: bool = False) -> None:
+        self.num_buckets = max(1, int(size_mb * 2**20) // (2 * ENTRY_SIZE))
+        self.slots: List[TTEntry | None] = [None] * (2 * self.num_buckets)
+        self.age = 0
+        self.symmetric = symmetric
+
+    def new_search(self) -> None:
+        """
+        Marks the entries stored until now as old, they get replaced first
+        """
+        self.age += 1
+
+    def clear(self) -> None:
+        self.slots = [None] * (2 * self.num_buckets)
+
+    def probe(self, key: int) -> TTEntry | None:
+        i = (key % self.num_buckets) * 2
+        entry = self.slots[i]
+        if entry is not None and entry.key == key:
+            return entry
+        entry = self.slots[i + 1]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(
+        self, key: int, score: float, flag: int, depth: int, move: int | None
+    ) -> None:
+        i = (key % self.num_buckets) * 2
+        entry = TTEntry(key, score, flag, depth, move, self.age)
+        old = self.slots[i]
+        if old is None or old.key == key or old.age != self.age or depth >= old.depth:
+            self.slots[i] = entry
+        else:
+            self.slots[i + 1] = entry
+
+
+# Packed entries are 3 words: key ^ score ^ info, score, info
+# info is move (bits 0-47, 0 when there is none), flag (48-49),
+# depth (50-57) and age (58-63)
+ENTRY_WORDS = 3
+# Words before the entries, the first one is the age
+HEADER_WORDS = 1
+MAX_PACKED_MOVE = (1 << 48) - 1
+
+
+class PackedTranspositionTable:
+    """
+    Transposition table packed in a writable buffer (shared memory, mmap, ...)
+    Same interface and replacement scheme as TranspositionTable
+    Entries have no lock, a key check made of the xor of the whole entry
+    turns a half written entry into a miss
+    """
+
+    def __init__(self, buf, symmetric: bool = False) -> None:
+        self.symmetric = symmetric
+        self.buf = memoryview(buf)
+        self.words = self.buf.cast("Q")
+        self.floats = self.buf.cast("d")
+        self.num_buckets = max(1, (len(self.words) - HEADER_WORDS) // (2 * ENTRY_WORDS))
+
+    @staticmethod
+    def words_needed(size_mb: float) -> int:
+        return HEADER_WORDS + int(size_mb * 2**20) // 8
+
+    @property
+    def age(self) -> int:
+        return self.words[0]
+
+    def new_search(self) -> None:
+        self.words[0] = (self.words[0] + 1) & 0x3F
+
+    def clear(self) -> None:
+        self.buf[HEADER_WORDS * 8 :] = bytes(len(self.buf) - HEADER_WORDS * 8)
+
+    def _read(self, j: int) -> TTEntry:
+        words = self.words
+        info = words[j + 2]
+        move = info & MAX_PACKED_MOVE
+        return TTEntry(
+            words[j] ^ words[j + 1] ^ info,
+            self.floats[j + 1],
+            info >> 48 & 0x3,
+            info >> 50 & 0xFF,
+            move if move != 0 else None,
+            info >> 58,
+        )
+
+    def probe(self, key: int) -> TTEntry | None:
+        j = HEADER_WORDS + (key % self.num_buckets) * 2 * ENTRY_WORDS
+        entry = self._read(j)
+        if entry.key == key:
+            return entry
+        entry = self._read(j + ENTRY_WORDS)
+        if entry.key == key:
+            return entry
+        return None
+
+    def store(
+        self, key: int, score: float, flag: int, depth: int, move: int | None
+    ) -> None:
+        j = HEADER_WORDS + (key % self.num_buckets) * 2 * ENTRY_WORDS
+        age = self.age
+        old = self._read(j)
+        if old.key != key and old.age == age and depth < old.depth:
+            j += ENTRY_WORDS
+
+        if move is None or move > MAX_PACKED_MOVE:
+            # Very long chains don't fit, they are only used for ordering
+            move = 0
+        info = move | flag << 48 | min(depth, 0xFF) << 50 | age << 58
+        self.floats[j + 1] = score
+        self.words[j + 2] = info
+        self.words[j] = key ^ self.words[j + 1] ^ info
+
+
+class SharedTranspositionTable(PackedTranspositionTable):
+    """
+    PackedTranspositionTable in shared memory
+    Pickling only sends the name, so workers of a process pool all use
+    the same table
+    """
+
+    def __init__(
+        self, size_mb: float = 16, name: str | None = None, symmetric: bool = False
+    ) -> None:
+        self.size_mb = size_mb
+        self.closed = False
+        size = self.words_needed(size_mb) * 8
+        if name is None:
+            self.shm = SharedMemory(create=True, size=size)
+            # Unlinked when collected or at exit
+            self._finalizer = weakref.finalize(self, self.shm.unlink)
+        else:
+            # Workers share the resource tracker of the creator, only the
+            # creator unlinks it
+            self.shm = SharedMemory(name=name)
+            self._finalizer = None
+        super().__init__(self.shm.buf[:size], symmetric)
+
+    def __reduce__(self):
+        return (_attach_shared_table, (self.shm.name, self.size_mb, self.symmetric))
+
+    def close(self) -> None:
+        """
+        Detaches from the shared memory, the creator also frees it
+        """
+        if self.closed:
+            return
+        self.closed = True
+        # Views first, shared memory can't close while they exist
+        self.words.release()
+        self.floats.release()
+        self.buf.release()
+        self.shm.close()
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+# Tables already attached in this process
+_attached: Dict[str, SharedTranspositionTable] = {}
+
+
+def _attach_shared_table(
+    name: str, size_mb: float, symmetric: bool
+) -> SharedTranspositionTable:
+    if name not in _attached:
+        _attached[name] = SharedTranspositionTable(size_mb, name, symmetric)
+    return _attached[name]
+
+
+# magic, format version, num_rows, num_cols, symmetric, evaluator tag
+FILE_HEADER = struct.Struct("<8sIBBBxQ")
+FILE_MAGIC = b"ALQTTAB\0"
+# Changes whenever the entry layout or the keys change
+FILE_VERSION = 3
+
+
+class FileTranspositionTable(PackedTranspositionTable):
+    """
+    PackedTranspositionTable in a memory mapped file, kept across games,
+    runs and processes
+    A file made for another format, geometry, size, evaluation functions or
+    symmetric setting is cleared when opened
+    """
+
+    def __init__(
+        self,
+        path: str,
+        num_rows: int,
+        num_cols: int,
+        evaluate_funcs: Iterable[Callable],
+        size_mb: float = 64,
+        symmetric: bool = False,
+    ) -> None:
+        self.path = path
+        header = FILE_HEADER.pack(
+            FILE_MAGIC,
+            FILE_VERSION,
+            num_rows,
+            num_cols,
+            symmetric,
+            evaluator_tag(evaluate_funcs),
+        )
+        size = FILE_HEADER.size + self.words_needed(size_mb) * 8
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            stale = os.pread(fd, FILE_HEADER.size, 0) != header
+            if stale or os.fstat(fd).st_size != size:
+                # Truncating first leaves only zeros, empty entries
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, header, 0)
+            self.mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        super().__init__(memoryview(self.mmap)[FILE_HEADER.size :], symmetric)
+
+    def flush(self) -> None:
+        self.mmap.flush()
+
+    def close(self) -> None:
+        self.words.release()
+        self.floats.release()
+        self.buf.release()
+        self.mmap.close()
+
+
+def evaluator_name(evaluate_func: Callable) -> str:
+    """
+    Name of an evaluation function, or of an argument of one, that is the
+    same in every process
+    """
+    wrapped = getattr(evaluate_func, "__wrapped__", None)
+    if wrapped is not None:
+        return evaluator_name(wrapped)
+    if isinstance(evaluate_func, partial):
+        args = ", ".join(map(evaluator_name, evaluate_func.args))
+        return f"{evaluator_name(evaluate_func.func)}({args})"
+    if callable(evaluate_func) and hasattr(evaluate_func, "__qualname__"):
+        return f"{evaluate_func.__module__}.{evaluate_func.__qualname__}"
+    if isinstance(evaluate_func, (int, float, str, bool, type(None))):
+        return repr(evaluate_func)
+
+    cls = type(evaluate_func)
+    name = f"{cls.__module__}.{cls.__qualname__}"
+    # Objects backed by a file (Tablebase, OpeningBook) are named by it
+    path = getattr(evaluate_func, "path", None)
+    if path is not None:
+        return f"{name}({os.path.abspath(path)})"
+    # The default repr has the address of the object
+    if cls.__repr__ is not object.__repr__:
+        return repr(evaluate_func)
+    return name
+
+
+def evaluator_tag(evaluate_funcs: Iterable[Callable]) -> int:
+    """
+    Hash of the names and code of evaluation functions, changes when any
+    of them is edited
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for evaluate_func in evaluate_funcs:
+        h.update(evaluator_name(evaluate_func).encode())
+        _hash_code(h, evaluate_func)
+    return int.from_bytes(h.digest(), "big")
+
+
+def _hash_code(h, func: Callable) -> None:
+    wrapped = getattr(func, "__wrapped__", None)
+    if wrapped is not None:
+        _hash_code(h, wrapped)
+        return
+    if isinstance(func, partial):
+        _hash_code(h, func.func)
+        for arg in func.args:
+            if callable(arg):
+                _hash_code(h, arg)
+        return
+    code = getattr(func, "__code__", None)
+    if code is not None:
+        _hash_code_object(h, code)
+
+
+def _hash_code_object(h, code: CodeType) -> None:
+    """
+    Hashes bytecode, names and constants, nested code objects (lambdas,
+    comprehensions) are hashed the same way since their repr has an address
+    """
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            _hash_code_object(h, const)
+        else:
+            h.update(repr(const).encode())
+
+
+def search_salt(evaluate_func: Callable, chains: bool = False) -> int:
+    """
+    Key xored into every position key so that searches with different
+    evaluation functions or rules can share a table
+    """
+    name = f"{evaluator_name(evaluate_func)}:{chains}"
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")